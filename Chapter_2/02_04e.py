@@ -6,14 +6,20 @@ import streamlit as st
 import pandas as pd
 from sklearn.datasets import load_iris
 import altair as alt
-from openai import OpenAI
+import os, sys
+
+#Make the shared LLM request scheduler in the Chapter_4 folder one level up importable
+chapter_4_dir = os.path.join(os.path.dirname(os.getcwd()), "Chapter_4")
+if chapter_4_dir not in sys.path:
+    sys.path.append(chapter_4_dir)
+from llm_scheduler import get_llm_scheduler
 
 #Open file with API key
 with open("openai_key.txt") as f:
     my_api_key = f.read().strip()
 
 #Initialize OpenAI client with your API key
-client = OpenAI(api_key=my_api_key)
+client = get_llm_scheduler(my_api_key)
 
 #Configure page
 st.set_page_config(page_title="Iris Dashboard", layout="wide")
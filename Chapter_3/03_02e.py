@@ -3,7 +3,14 @@
 
 #Import packages
 import streamlit as st
-import pandas as pd
+import os, sys
+
+#Make the shared dataset store in the Chapter_4 folder one level up importable, since the Excel ingest helpers
+#in this folder save their merged data through it
+chapter_4_dir = os.path.join(os.path.dirname(os.getcwd()), "Chapter_4")
+if chapter_4_dir not in sys.path:
+    sys.path.append(chapter_4_dir)
+from excel_ingest import read_merged_workbooks
 
 #Write title
 st.title("Upload and Preview Data")
@@ -11,23 +18,25 @@ st.title("Upload and Preview Data")
 st.write("Upload two hotel data files, merge on `Hotel ID`, and preview.")
 
 #Add file upload widget for revenue and expenses file
-rev_exp_file = st.file_uploader("Upload Revenue and Expenses (xlsx)", type="xlsx")
+rev_exp_file = st.file_uploader("Upload Revenue and Expenses (xlsx or csv)", type=["xlsx", "csv"])
 #Add file upload widget for location file
-loc_file = st.file_uploader("Upload Location (xlsx)", type="xlsx")
+loc_file = st.file_uploader("Upload Location (xlsx or csv)", type=["xlsx", "csv"])
 
 #Check if both files have been uploaded
 if rev_exp_file and loc_file:
-    #Display a spinner while files are being processed
-    with st.spinner("Reading and merging files…"):
-        #Read in revenue and expenses file
-        df_rev_exp = pd.read_excel(rev_exp_file)
-        #Read in location file
-        df_loc = pd.read_excel(loc_file)
-        #Merge files on 'Hotel ID'
-        df = (
-            df_rev_exp
-            .merge(df_loc, on="Hotel ID", how="outer")
-        )
+    #Display a progress bar while files are being processed
+    progress_bar = st.progress(0.0, text="Reading and merging files…")
+    rows_read = [0]
+
+    #Update the progress bar after each batch of rows is merged
+    def show_progress(fraction, rows):
+        rows_read[0] += rows
+        progress_bar.progress(min(fraction or 0.0, 1.0), text=f"Reading and merging files… {rows_read[0]:,} rows")
+
+    #Read in both files and merge them on 'Hotel ID'; the revenue and expenses file is streamed in batches, and files
+    #are identified by a hash of their bytes, so uploads seen before are read from the ingest cache instead
+    df, _ = read_merged_workbooks(rev_exp_file, loc_file, progress=show_progress)
+    progress_bar.empty()
     #Display success message when files are merged
     st.success("Files merged successfully!")
     #Add subheader for merged data preview
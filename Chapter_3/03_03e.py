@@ -3,26 +3,29 @@
 
 #Import packages
 import streamlit as st
-import pandas as pd
-import runpy, tempfile, os, pickle
-from openai import OpenAI
+import os, sys
+
+#Make the shared LLM request scheduler and dataset store in the Chapter_4 folder one level up importable
+chapter_4_dir = os.path.join(os.path.dirname(os.getcwd()), "Chapter_4")
+if chapter_4_dir not in sys.path:
+    sys.path.append(chapter_4_dir)
+from llm_scheduler import get_llm_scheduler
+from code_worker import get_code_worker
+from excel_ingest import read_merged_workbooks
 
 #Open file with API key
 with open("openai_key.txt") as f:
     my_api_key = f.read().strip()
 
 #Initialize OpenAI client with your API key
-client = OpenAI(api_key=my_api_key)
+client = get_llm_scheduler(my_api_key)
 
 #Write title
 st.title("Explore and Summarize Data with AI")
 
-#Load revenue and expenses file
-df_rev_exp = pd.read_excel("Landon_Hotel_Revenue_And_Expenses.xlsx")
-#Load location file
-df_loc = pd.read_excel("Landon_Hotel_Location.xlsx")
-#Merge datasets on 'Hotel ID'
-df = df_rev_exp.merge(df_loc, on="Hotel ID", how="outer")
+#Load the revenue and expenses file and the location file merged on 'Hotel ID', parsing them only the first time their
+#contents are seen and reading the cached merge on later reruns
+df, data_key = read_merged_workbooks("Landon_Hotel_Revenue_And_Expenses.xlsx", "Landon_Hotel_Location.xlsx")
 
 #Add subheader for merged data preview
 st.subheader("Merged Data Preview")
@@ -88,49 +91,9 @@ if st.button("Ask AI"):
                 #Display extracted AI-generated code with syntax highlighting
                 st.code(clean_answer, language="python")
 
-                #Save current dataframe to a pickle file for use by temp code
-                with open("df.pkl", "wb") as f:
-                    pickle.dump(df, f)
-
-                #Create temporary Python script containing AI-generated code
-                temp_code = f"""
-import pickle
-
-#Load dataframe
-with open("df.pkl", "rb") as f:
-    df = pickle.load(f)
-
-#AI analysis code
-{clean_answer}
-
-#Save result
-try:
-    result 
-except NameError:
-    try:
-        result = expenses_summary 
-    except:
-        try:
-            result = payroll_summary
-        except:
-            result = "No result variable found."
-
-with open("result.pkl", "wb") as f:
-    pickle.dump(result, f)
-"""
-
-                #Create a temporary file to write the AI Python code into
-                with tempfile.NamedTemporaryFile("w", suffix=".py", delete=False) as tmp:
-                    tmp.write(temp_code)
-                    tmp.flush()
-                    #Run temporary Python file
-                    runpy.run_path(tmp.name)
-                    #Delete temporary file after running
-                    os.remove(tmp.name)
-
-                #Load result back from the pickle file
-                with open("result.pkl", "rb") as f:
-                    result = pickle.load(f)
+                #Run the AI-generated code in the shared worker process, which maps the dataframe from shared memory and
+                #only receives it again when the merged files' contents change
+                result = get_code_worker().run(clean_answer, df, data_key)
 
                 #Add subheader for execution result
                 st.subheader("Execution Result")
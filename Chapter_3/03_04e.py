@@ -3,36 +3,69 @@
 
 #Import packages
 import streamlit as st
-import pandas as pd
-import runpy, tempfile, os, pickle
-from openai import OpenAI
+import os, sys
+
+#Make the shared dataset store in the Chapter_4 folder one level up importable
+chapter_4_dir = os.path.join(os.path.dirname(os.getcwd()), "Chapter_4")
+if chapter_4_dir not in sys.path:
+    sys.path.append(chapter_4_dir)
+from data_store import dataset_exists, dataset_version, load_dataset
+from llm_scheduler import get_llm_scheduler
+from code_worker import get_code_worker
+from cleaning_log import get_cleaning_log
+from excel_ingest import read_merged_workbooks
 
 #Open file with API key
 with open("openai_key.txt") as f:
     my_api_key = f.read().strip()
 
 #Initialize OpenAI client with your API key
-client = OpenAI(api_key=my_api_key)
+client = get_llm_scheduler(my_api_key)
 
 #Write title
 st.title("Clean Data with AI")
 
 #Check if cleaned dataset exists and load it if available
-if os.path.exists("cleaned_data_final.pkl"):
-    with open("cleaned_data_final.pkl", "rb") as f:
-        df = pickle.load(f)
+if dataset_exists():
+    df = load_dataset()
+    data_source = dataset_version()
     #Display success message when cleaned data is loaded
     st.success("Existing cleaned dataset loaded.")
 else:
-    #Load revenue and expenses file
-    df_rev_exp = pd.read_excel("Landon_Hotel_Revenue_And_Expenses.xlsx")
-    #Load location file
-    df_loc = pd.read_excel("Landon_Hotel_Location.xlsx")
-    #Merge files on 'Hotel ID'
-    df = df_rev_exp.merge(df_loc, on="Hotel ID", how="outer")
+    #Load revenue and expenses file and location file merged on 'Hotel ID', from the ingest cache after the first parse
+    df, data_source = read_merged_workbooks("Landon_Hotel_Revenue_And_Expenses.xlsx", "Landon_Hotel_Location.xlsx")
     #Display success message when raw data is loaded
     st.success("Raw merged dataset loaded.")
 
+#Path of the cleaned dataset in the Chapter_4 folder one level up
+chapter_4_path = os.path.join(chapter_4_dir, "cleaned_data_final.arrow")
+#Ensure Chapter_4 exists
+os.makedirs(os.path.dirname(chapter_4_path), exist_ok=True)
+
+#Get the shared log of cleaning steps, and start it from the loaded data unless the dataset already is its current step
+#(data loaded from the same file version or workbooks as the first step isn't hashed again)
+log = get_cleaning_log()
+if not (dataset_exists() and log.is_head(dataset_version()[0])):
+    log.start(df, source=data_source)
+
+#Point the datasets in the current folder and in the Chapter_4 folder one level up at the current step's checkpoint
+def publish_current_step():
+    log.publish("cleaned_data_final.arrow", chapter_4_path)
+
+#Add subheader for the cleaning steps applied so far
+st.subheader("Cleaning Steps")
+#List each step, marking the current one; steps after it were undone and can be redone
+for i, step, is_head in log.steps():
+    label = "Starting data" if step["code"] is None else step["code"].splitlines()[0]
+    st.write(f"{'**→**' if is_head else '•'} Step {i}: `{label}`")
+#Add undo and redo buttons, which only move the log's pointer and re-point the datasets at that step's checkpoint
+undo_col, redo_col = st.columns(2)
+moved = undo_col.button("Undo Last Step") and log.undo()
+moved = (redo_col.button("Redo Step") and log.redo()) or moved
+if moved:
+    publish_current_step()
+    df = load_dataset()
+
 #Add subheader for current data preview
 st.subheader("Current Working Data Preview")
 #Display first few rows of current dataframe
@@ -117,53 +150,14 @@ if st.button("Generate Cleaning Code"):
 if st.session_state.latest_code:
     if st.button("Apply & Save Cleaning Change"):
         try:
-            #Save current dataframe to a pickle file for use by temp script
-            with open("cleaned_data_final.pkl", "wb") as f:
-                pickle.dump(df, f)
-
-            #Also save cleaned dataset to the Chapter_4 folder one level up
-            chapter_4_path = os.path.join(os.path.dirname(os.getcwd()), "Chapter_4", "cleaned_data_final.pkl")
-            #Ensure Chapter_4 exists
-            os.makedirs(os.path.dirname(chapter_4_path), exist_ok=True)  
-            #Save current dataframe to a pickle file for use by temp script
-            with open(chapter_4_path, "wb") as f:
-                pickle.dump(df, f)
-
-            #Create temporary Python script containing AI-generated cleaning code
-            temp_code = f"""
-import pickle
-import os
-
-#Load existing dataframe
-with open("cleaned_data_final.pkl", "rb") as f:
-    df = pickle.load(f)
-
-#AI-generated cleaning code
-{st.session_state.latest_code}
-
-#Save updated dataframe back to current folder
-with open("cleaned_data_final.pkl", "wb") as f:
-    pickle.dump(df, f)
-
-#Save updated dataframe to Chapter_4 folder one level up
-chapter_4_path = os.path.join(os.path.dirname(os.getcwd()), "Chapter_4", "cleaned_data_final.pkl")
-os.makedirs(os.path.dirname(chapter_4_path), exist_ok=True)
-with open(chapter_4_path, "wb") as f:
-    pickle.dump(df, f)
-"""
-
-            #Create a temporary file to write the AI Python code into
-            with tempfile.NamedTemporaryFile("w", suffix=".py", delete=False) as tmp:
-                tmp.write(temp_code)
-                tmp.flush()
-                #Run the temporary Python file
-                runpy.run_path(tmp.name)
-                #Delete the temporary file after running
-                os.remove(tmp.name)
-
-            #Load updated cleaned dataframe from pickle file
-            with open("cleaned_data_final.pkl", "rb") as f:
-                df = pickle.load(f)
+            #Run only the AI-generated cleaning code in the shared worker, against the last step's checkpoint, and save
+            #its result as the next step's checkpoint
+            log.apply(st.session_state.latest_code, get_code_worker())
+            #Point both folders' datasets at the new step
+            publish_current_step()
+
+            #Load updated cleaned dataframe from the dataset store
+            df = load_dataset()
 
             #Display success message when cleaning code is applied
             st.success("Cleaning applied and saved successfully!")
@@ -181,6 +175,14 @@ with open(chapter_4_path, "wb") as f:
 
 #Convert cleaned dataframe to CSV for download
 csv = df.to_csv(index=False)
+#Apply, Undo and Redo only move the references, so write the current step to the pickles the earlier lessons and
+#the deployed dashboard read only when asked to
+if st.button("Export for Deployment"):
+    log.export("cleaned_data_final.pkl", os.path.splitext(chapter_4_path)[0] + ".pkl")
+    #Link the datasets again so the references stay newer than the pickles just written
+    publish_current_step()
+    st.success("Cleaned data exported to cleaned_data_final.pkl in this folder and in Chapter_4.")
+
 #Add download button to allow users to download cleaned data as CSV file
 st.download_button(
     label="Download CSV",
@@ -4,54 +4,42 @@
 #Import packages
 import streamlit as st
 import pandas as pd
-import os, pickle
-from openai import OpenAI
+import os, sys
 import numpy as np
 
+#Make the shared dataset loader in the Chapter_4 folder one level up importable
+chapter_4_dir = os.path.join(os.path.dirname(os.getcwd()), "Chapter_4")
+if chapter_4_dir not in sys.path:
+    sys.path.append(chapter_4_dir)
+from data_store import dataset_exists, load_dataset
+from column_stats import column_catalog, summarize_columns
+from llm_scheduler import get_llm_scheduler
+
 #Open file with API key
 with open("openai_key.txt") as f:
     my_api_key = f.read().strip()
 
 #Initialize OpenAI client with your API key
-client = OpenAI(api_key=my_api_key)
+client = get_llm_scheduler(my_api_key)
 
 #Write title
 st.title("Identify KPI Metrics")
 
 #Check if cleaned dataset exists, stop app if not found
-if not os.path.exists("cleaned_data_final.pkl"):
+if not dataset_exists():
     st.error("No cleaned dataset found. Please complete previous lessons first.")
     st.stop()
 
-#Load cleaned dataset from pickle file
-with open("cleaned_data_final.pkl", "rb") as f:
-    df = pickle.load(f)
+#Load cleaned dataset through the shared cache, only re-reading the file when it changes
+df = load_dataset()
 
 #Add subheader for cleaned data preview
 st.subheader("Cleaned Data Preview")
 #Display first few rows of cleaned data
 st.dataframe(df.head())
 
-#Build a summary of each column’s data type, values, and stats
-column_summaries = []
-#Loop through each column in the dataframe
-for col in df.columns:
-    #Check if column is numeric and capture min and max values
-    if pd.api.types.is_numeric_dtype(df[col]):
-        col_summary = f"- `{col}` (numeric): min = {df[col].min()}, max = {df[col].max()}"
-    #Check if column is date type and capture date range
-    elif pd.api.types.is_datetime64_any_dtype(df[col]):
-        col_summary = f"- `{col}` (date): min = {df[col].min().date()}, max = {df[col].max().date()}"
-    #Otherwise treat as categorical or text and capture sample values
-    else:
-        unique_vals = df[col].dropna().unique()
-        sample_vals = ", ".join(map(str, unique_vals[:5]))
-        col_summary = f"- `{col}` (categorical/text): example values = {sample_vals}"
-    #Add column summary to list
-    column_summaries.append(col_summary)
-
-#Convert list of column summaries into markdown-formatted string
-column_summary_md = "\n".join(column_summaries)
+#Build a summary of each column’s data type, values, and stats from the shared per-dataset statistics
+column_summary_md = summarize_columns(column_catalog())
 
 #Create text input area for user to request KPI suggestions or targeted metric questions
 user_prompt = st.text_area(
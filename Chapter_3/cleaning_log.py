@@ -0,0 +1,158 @@
+#Build with AI: AI-Powered Dashboards with Streamlit
+#Keep Cleaning Steps as a Replayable Log of Checkpoints
+
+#Import packages
+import streamlit as st
+import pandas as pd
+import hashlib, json, os, pickle, threading, time
+from data_store import atomic_path, link_dataset, load_dataset, save_dataset
+
+#Folder holding the step log and one Arrow checkpoint per step
+CLEANING_DIR = "cleaning_steps"
+LOG_FILE = "log.json"
+
+
+#Identify a step by its code and the step it was applied to, so the same code on the same data is never run twice
+def _step_hash(parent_hash, code):
+    return hashlib.sha256(f"{parent_hash}\n{code}".encode("utf-8")).hexdigest()
+
+
+#Identify a starting dataset by its columns, types and values
+def _frame_hash(df):
+    described = "\n".join(f"{col}:{dtype}" for col, dtype in df.dtypes.items())
+    digest = hashlib.sha256(described.encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    return digest.hexdigest()
+
+
+#Ordered log of cleaning steps, each with the code that produced it and a columnar snapshot of its result
+class CleaningLog:
+    """Apply cleaning code one step at a time against the last checkpoint, with undo and redo as pointer moves."""
+
+    def __init__(self, folder=CLEANING_DIR):
+        self.folder = folder
+        self._log_path = os.path.join(folder, LOG_FILE)
+        self._lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+        if os.path.exists(self._log_path):
+            with open(self._log_path, encoding="utf-8") as f:
+                self._state = json.load(f)
+        else:
+            self._state = {"steps": [], "head": -1}
+
+    #Replace the log file atomically so a crash never leaves half a log behind
+    def _write(self):
+        with atomic_path(self._log_path) as tmp_path, open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._state, f, indent=1)
+
+    def _checkpoint_path(self, step_hash):
+        return os.path.abspath(os.path.join(self.folder, step_hash[:16] + ".arrow"))
+
+    #Drop the steps after the head, deleting checkpoints no remaining step uses
+    def _truncate(self):
+        steps, head = self._state["steps"], self._state["head"]
+        kept = {step["checkpoint"] for step in steps[:head + 1]}
+        for step in steps[head + 1:]:
+            if step["checkpoint"] not in kept and os.path.exists(step["checkpoint"]):
+                os.remove(step["checkpoint"])
+        del steps[head + 1:]
+
+    def _add(self, step_hash, code, checkpoint, source=None):
+        self._state["steps"].append({
+            "hash": step_hash, "code": code, "checkpoint": checkpoint,
+            "parent": self.head["hash"] if self.head else None, "source": source, "created": time.time(),
+        })
+        self._state["head"] += 1
+        self._write()
+
+    @property
+    def head(self):
+        """The current step, or None before the log is started."""
+        head = self._state["head"]
+        return self._state["steps"][head] if head >= 0 else None
+
+    def steps(self):
+        """Return (index, step, is_head) for every step, including undone ones that can still be redone."""
+        head = self._state["head"]
+        return [(i, step, i == head) for i, step in enumerate(self._state["steps"])]
+
+    def is_head(self, path):
+        """Return True if `path` is the current step's checkpoint."""
+        return self.head is not None and os.path.abspath(path) == self.head["checkpoint"]
+
+    def start(self, df, source=None):
+        """Begin a new log from `df` unless it is already the current step's data; a `source` key seen before skips hashing it."""
+        source = None if source is None else str(source)
+        with self._lock:
+            #Data loaded from the same version of the same file as the current step needs no hashing
+            if source is not None and self.head is not None and self.head.get("source") == source:
+                return
+            step_hash = _frame_hash(df)
+            if self.head is not None and self.head["hash"] == step_hash:
+                self.head["source"] = source
+                self._write()
+                return
+            self._state["head"] = -1
+            self._truncate()
+            checkpoint = self._checkpoint_path(step_hash)
+            save_dataset(df, checkpoint)
+            self._add(step_hash, None, checkpoint, source)
+
+    def apply(self, code, worker):
+        """Run `code` in `worker` against the current checkpoint only, and make its result the new current step."""
+        with self._lock:
+            if self.head is None:
+                raise RuntimeError("the cleaning log has not been started")
+            parent = self.head
+            step_hash = _step_hash(parent["hash"], code)
+            #Re-applying an undone step is the same as redoing it
+            following = self._state["steps"][self._state["head"] + 1:]
+            if following and following[0]["hash"] == step_hash:
+                self._state["head"] += 1
+                self._write()
+                return self.head
+            self._truncate()
+            checkpoint = self._checkpoint_path(step_hash)
+            #Checkpoints never change once written, so the file's path identifies the worker's data
+            if not os.path.exists(checkpoint):
+                worker.run(code, parent["checkpoint"], parent["checkpoint"], save_paths=[checkpoint])
+            self._add(step_hash, code, checkpoint)
+            return self.head
+
+    def undo(self):
+        """Move back one step, keeping the undone step so it can be redone; returns False at the first step."""
+        with self._lock:
+            if self._state["head"] <= 0:
+                return False
+            self._state["head"] -= 1
+            self._write()
+            return True
+
+    def redo(self):
+        """Move forward to the next undone step; returns False if there is none."""
+        with self._lock:
+            if self._state["head"] >= len(self._state["steps"]) - 1:
+                return False
+            self._state["head"] += 1
+            self._write()
+            return True
+
+    def publish(self, *paths):
+        """Point each dataset path at the current checkpoint instead of writing another copy of it."""
+        return [link_dataset(self.head["checkpoint"], path) for path in paths]
+
+    #Checkpoints and references stay on this machine, so a deployed app only sees data written to a committed file
+    def export(self, *paths):
+        """Write the current step's data to each pickle path, e.g. the committed dataset the deployed dashboard ships with."""
+        df = load_dataset(self.head["checkpoint"])
+        for path in paths:
+            with atomic_path(path) as tmp_path, open(tmp_path, "wb") as f:
+                pickle.dump(df, f)
+        return list(paths)
+
+
+#Keep one log per folder for the whole server, so every session sees the same steps
+@st.cache_resource(show_spinner=False)
+def get_cleaning_log(folder=CLEANING_DIR):
+    """Return the shared CleaningLog for `folder`."""
+    return CleaningLog(folder)
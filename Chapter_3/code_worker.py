@@ -0,0 +1,148 @@
+#Build with AI: AI-Powered Dashboards with Streamlit
+#Run AI-Generated Code in a Long-Lived Worker Process
+
+#Import packages
+import streamlit as st
+import pandas as pd
+import multiprocessing, os, pickle, threading
+from shared_frame import attach_frame, publish_frame, release_segment
+from data_store import save_dataset
+
+#Seconds a piece of generated code may run before its worker is stopped
+CODE_TIMEOUT_S = 30
+
+#Address space the worker may use, so runaway code fails with MemoryError instead of exhausting the server
+WORKER_MEMORY_MB = 4096
+
+#Variables checked, in order, for the result of the generated code
+RESULT_NAMES = ("result", "expenses_summary", "payroll_summary")
+
+
+#Worker loop: map the latest published DataFrame and run each piece of code sent over the pipe against it
+def _worker_main(conn, memory_mb):
+    #Cap the worker's memory where the platform supports it
+    try:
+        import resource
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, ValueError, OSError):
+        pass
+    #Shallow copies handed to generated code must never write through to the held frame
+    if int(pd.__version__.split(".")[0]) < 3:
+        pd.set_option("mode.copy_on_write", True)
+    df, segment = None, None
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+        if message[0] == "load":
+            #Drop the previous frame before mapping the new one
+            df = None
+            if segment is not None:
+                release_segment(segment)
+            try:
+                df, segment = attach_frame(message[1])
+                conn.send(("loaded", None))
+            except BaseException as e:
+                conn.send(("error", f"{type(e).__name__}: {e}"))
+            continue
+        try:
+            namespace = {"df": df.copy(deep=False), "pd": pd}
+            exec(message[1], namespace)
+            #Save the transformed df for cleaning code, otherwise return the analysis result
+            if message[2]:
+                for path in message[2]:
+                    save_dataset(namespace["df"], path)
+                conn.send(("ok", None))
+                continue
+            result = next((namespace[name] for name in RESULT_NAMES if name in namespace), "No result variable found.")
+            #Send results that can't be pickled as their text instead
+            try:
+                pickle.dumps(result)
+            except Exception:
+                result = repr(result)
+            conn.send(("ok", result))
+        except BaseException as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+
+#Long-lived worker process that holds the DataFrame and executes code against it
+class CodeWorker:
+    """Execute generated code against a DataFrame in a separate process, with a timeout and a memory cap."""
+
+    def __init__(self, timeout=CODE_TIMEOUT_S, memory_mb=WORKER_MEMORY_MB):
+        self.timeout = timeout
+        self.memory_mb = memory_mb
+        self._process = None
+        self._conn = None
+        self._data_key = None
+        self._lock = threading.Lock()
+
+    #Start a fresh worker, which has no data loaded yet
+    def _start(self):
+        ctx = multiprocessing.get_context("spawn")
+        self._conn, child_conn = ctx.Pipe()
+        self._process = ctx.Process(target=_worker_main, args=(child_conn, self.memory_mb), daemon=True)
+        self._process.start()
+        child_conn.close()
+        self._data_key = None
+
+    #Stop a worker that hung or died, so the next call starts a new one
+    def _stop(self):
+        if self._process is not None:
+            self._process.kill()
+            self._process.join()
+        self._process, self._conn, self._data_key = None, None, None
+
+    #Send a message and wait for the reply, stopping the worker if it takes too long or dies
+    def _call(self, message, timeout):
+        self._conn.send(message)
+        if not self._conn.poll(timeout):
+            self._stop()
+            raise TimeoutError(f"generated code did not finish within {timeout} s")
+        try:
+            return self._conn.recv()
+        except EOFError:
+            self._stop()
+            raise RuntimeError("the code worker stopped unexpectedly")
+
+    #Publish the frame into shared memory and have the worker map it; the segment is unlinked once it's mapped.
+    #A path to an Arrow file is mapped by the worker directly
+    def _load(self, df, data_key):
+        if isinstance(df, str):
+            segment, handle = None, ("file", os.path.abspath(df), None)
+        else:
+            segment, handle = publish_frame(df)
+        try:
+            status, value = self._call(("load", handle), self.timeout)
+        finally:
+            release_segment(segment, unlink=True)
+        if status == "error":
+            raise RuntimeError(value)
+        self._data_key = data_key
+
+    #Publish `df` only when `data_key` differs from the last call (or is None), then run the code against it
+    def run(self, code, df, data_key, save_paths=None):
+        """Run `code` against `df` (a DataFrame or Arrow file path) and return its result, or save the new df to `save_paths`."""
+        with self._lock:
+            if self._process is None or not self._process.is_alive():
+                self._start()
+            if data_key is None or data_key != self._data_key:
+                self._load(df, data_key)
+            status, value = self._call(("run", code, list(save_paths or [])), self.timeout)
+        if status == "error":
+            raise RuntimeError(value)
+        return value
+
+    def close(self):
+        """Stop the worker process."""
+        with self._lock:
+            self._stop()
+
+
+#Start one worker for the whole server, shared by every session
+@st.cache_resource(show_spinner=False)
+def get_code_worker():
+    """Return the shared CodeWorker."""
+    return CodeWorker()
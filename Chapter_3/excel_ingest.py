@@ -0,0 +1,202 @@
+#Build with AI: AI-Powered Dashboards with Streamlit
+#Parse Each Workbook Once and Serve It from a Columnar Cache
+
+#Import packages
+import streamlit as st
+import pandas as pd
+import pyarrow as pa
+import hashlib, os, shutil, tempfile
+from openpyxl import load_workbook
+from data_store import atomic_path, load_dataset, save_dataset
+
+#Folder holding one Arrow file per parsed workbook sheet and per merged pair of workbooks
+INGEST_CACHE_DIR = "ingest_cache"
+
+#Bytes read at a time when hashing a workbook on disk
+HASH_CHUNK_BYTES = 1 << 20
+
+#Rows converted to a typed column batch at a time while streaming a large file
+BATCH_ROWS = 50000
+
+
+#Hash a workbook on disk once per version of the file, so reruns don't read it again
+@st.cache_data(max_entries=64, show_spinner=False)
+def _path_digest(path, mtime_ns, size):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+#Hash a workbook given as a path, raw bytes or an uploaded file, so the same contents always get the same key
+def file_digest(source):
+    """Return the sha256 of a workbook's bytes; uploads of a file already read from disk get the same digest."""
+    if isinstance(source, (str, os.PathLike)):
+        stat = os.stat(source)
+        return _path_digest(os.path.abspath(source), stat.st_mtime_ns, stat.st_size)
+    data = source if isinstance(source, bytes) else source.getvalue()
+    return hashlib.sha256(data).hexdigest()
+
+
+#Tell CSV files from workbooks by their file name
+def _is_csv(source):
+    name = source if isinstance(source, (str, os.PathLike)) else getattr(source, "name", "")
+    return str(name).lower().endswith(".csv")
+
+
+#Size of a source in bytes, used to report progress through CSV files
+def _source_size(source):
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.getsize(source)
+    return len(source) if isinstance(source, bytes) else len(source.getbuffer())
+
+
+def _cache_path(key):
+    return os.path.join(INGEST_CACHE_DIR, key + ".arrow")
+
+
+#Serve a cached frame, building and saving it first if it isn't cached yet
+def _cached(key, build):
+    path = _cache_path(key)
+    if not os.path.exists(path):
+        os.makedirs(INGEST_CACHE_DIR, exist_ok=True)
+        save_dataset(build(), path)
+    return load_dataset(path)
+
+
+#Read one sheet of a workbook (or a CSV file), parsing it only the first time its contents are seen
+def read_workbook(source, sheet_name=0):
+    """Return the sheet as a DataFrame from the columnar cache, keyed by the workbook's hash and the sheet."""
+    key = hashlib.sha256(f"{file_digest(source)}:{sheet_name}".encode("utf-8")).hexdigest()[:32]
+    if _is_csv(source):
+        return _cached(key, lambda: pd.read_csv(source))
+    return _cached(key, lambda: pd.read_excel(source, sheet_name=sheet_name))
+
+
+#Stream a workbook sheet's rows with openpyxl's read-only mode, which never holds the whole sheet in memory
+def _workbook_batches(source, sheet_name, batch_rows):
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[sheet_name] if isinstance(sheet_name, int) else workbook[sheet_name]
+        total = sheet.max_row
+        rows = sheet.iter_rows(values_only=True)
+        header = [str(name) for name in next(rows, ())]
+        batch, done = [], 0
+        for row in rows:
+            batch.append(row)
+            if len(batch) == batch_rows:
+                done += len(batch)
+                yield pd.DataFrame.from_records(batch, columns=header), (done / (total - 1) if total and total > 1 else None)
+                batch = []
+        if batch or not done:
+            yield pd.DataFrame.from_records(batch, columns=header), 1.0
+    finally:
+        workbook.close()
+
+
+#Stream a CSV file in chunks, reporting how far through its bytes the reader is
+def _csv_batches(source, batch_rows):
+    size = _source_size(source)
+    handle = open(source, "rb") if isinstance(source, (str, os.PathLike)) else source
+    try:
+        handle.seek(0)
+        for chunk in pd.read_csv(handle, chunksize=batch_rows):
+            yield chunk, (handle.tell() / size if size else None)
+    finally:
+        if handle is not source:
+            handle.close()
+
+
+#Read a workbook sheet or CSV file as typed column batches of at most `batch_rows` rows
+def iter_batches(source, sheet_name=0, batch_rows=BATCH_ROWS):
+    """Yield (DataFrame, fraction done) pairs; the fraction is None when the file doesn't say how long it is."""
+    if _is_csv(source):
+        return _csv_batches(source, batch_rows)
+    return _workbook_batches(source, sheet_name, batch_rows)
+
+
+#Combine the column types seen across batches, falling back to text for a column whose batches disagree
+def _unify(schemas):
+    try:
+        return pa.unify_schemas(schemas, promote_options="permissive")
+    except (pa.ArrowInvalid, pa.ArrowTypeError, NotImplementedError):
+        fields = []
+        for name in schemas[0].names:
+            types = [schema.field(name) for schema in schemas]
+            try:
+                fields.append(pa.unify_schemas([pa.schema([f]) for f in types], promote_options="permissive").field(name))
+            except (pa.ArrowInvalid, pa.ArrowTypeError, NotImplementedError):
+                fields.append(pa.field(name, pa.string()))
+        return pa.schema(fields, metadata=schemas[0].metadata)
+
+
+#Write batches to one Arrow file, one batch in memory at a time; each batch is spilled first so types can be unified
+def _write_batches(batches, path):
+    spill_dir = tempfile.mkdtemp(dir=os.path.dirname(path) or ".")
+    try:
+        parts = []
+        for batch in batches:
+            part = os.path.join(spill_dir, f"{len(parts)}.arrow")
+            table = pa.Table.from_pandas(batch, preserve_index=False)
+            with pa.OSFile(part, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+            parts.append((part, table.schema))
+        schema = _unify([part_schema for _, part_schema in parts])
+        with atomic_path(path) as tmp_path, pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+            for part, _ in parts:
+                writer.write_table(pa.ipc.open_file(pa.memory_map(part, "r")).read_all().cast(schema))
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+
+
+#Join each batch of the large table to the small one through a hash index on `on`, then add unmatched small-table rows
+def _merge_batches(batches, small, on, progress):
+    index = pd.Index(small[on])
+    matched = pd.Series(False, index=small.index)
+    columns = None
+    for batch, fraction in batches:
+        #Add pandas' _x/_y suffixes to columns both tables share, as an outer merge would
+        if columns is None:
+            shared = (set(batch.columns) & set(small.columns)) - {on}
+            big_names = {c: f"{c}_x" for c in shared}
+            small_part = small.drop(columns=[on]).rename(columns={c: f"{c}_y" for c in shared})
+            columns = [big_names.get(c, c) for c in batch.columns] + list(small_part.columns)
+        if index.is_unique:
+            positions = index.get_indexer(batch[on])
+            found = positions >= 0
+            matched.iloc[positions[found]] = True
+            #Rows without a match look up position -1, which reindexing fills with missing values
+            lookup = small_part.reset_index(drop=True).reindex(positions).reset_index(drop=True)
+            merged = pd.concat([batch.rename(columns=big_names).reset_index(drop=True), lookup], axis=1)
+        #A small table with repeated keys can match a row more than once, so let pandas expand those rows
+        else:
+            matched |= small[on].isin(batch[on])
+            merged = batch.rename(columns=big_names).merge(
+                small_part.assign(**{on: small[on].values}), on=on, how="left")[columns]
+        if progress is not None:
+            progress(fraction, len(merged))
+        yield merged
+    if columns is None:
+        return
+    unmatched = small_part[~matched.values]
+    if len(unmatched):
+        extra = pd.DataFrame({c: [None] * len(unmatched) for c in columns if c not in unmatched.columns}, index=unmatched.index)
+        extra[on] = small.loc[~matched.values, on]
+        yield pd.concat([extra, unmatched], axis=1)[columns].reset_index(drop=True)
+
+
+#Read and merge the revenue and expenses file with the location file, caching the merged result too
+def read_merged_workbooks(rev_exp_source, loc_source, on="Hotel ID", batch_rows=BATCH_ROWS, progress=None):
+    """Return (df, key): the outer merge of both files on `on`, and a key that changes only with their contents.
+
+    The revenue and expenses file is streamed in batches, so memory use is bounded by one batch plus the location
+    table; `progress(fraction, rows)` is called after each batch.
+    """
+    key = hashlib.sha256(f"{file_digest(rev_exp_source)}:{file_digest(loc_source)}:{on}".encode("utf-8")).hexdigest()[:32]
+    path = _cache_path(key)
+    if not os.path.exists(path):
+        os.makedirs(INGEST_CACHE_DIR, exist_ok=True)
+        batches = iter_batches(rev_exp_source, batch_rows=batch_rows)
+        _write_batches(_merge_batches(batches, read_workbook(loc_source), on, progress), path)
+    return load_dataset(path), key
@@ -0,0 +1,72 @@
+#Build with AI: AI-Powered Dashboards with Streamlit
+#Hand a DataFrame to Another Process Through Shared Memory
+
+#Import packages
+import pyarrow as pa
+import gc, os, sys
+from multiprocessing import shared_memory
+
+#Folder where Linux exposes POSIX shared memory segments as files
+SHM_DIR = "/dev/shm"
+
+
+#Path of a segment as a file, when the platform exposes one, so Arrow can map it and manage the mapping itself
+def _segment_path(name):
+    path = os.path.join(SHM_DIR, name.lstrip("/"))
+    return path if os.path.exists(path) else None
+
+
+#Write a DataFrame's columns once into a new shared memory segment as an Arrow IPC file
+def publish_frame(df):
+    """Return (segment, handle): the shared memory segment holding `df` and the handle another process attaches with."""
+    table = pa.Table.from_pandas(df)
+    #Measure the file first so the segment is created at exactly the right size
+    sink = pa.MockOutputStream()
+    with pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    size = sink.size()
+    segment = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    path = _segment_path(segment.name)
+    #Write through an Arrow memory map where possible, otherwise through the segment's own buffer
+    if path is not None:
+        segment.close()
+        target = pa.memory_map(path, "r+")
+    else:
+        target = pa.FixedSizeBufferWriter(pa.py_buffer(segment.buf))
+    with pa.ipc.new_file(target, table.schema) as writer:
+        writer.write_table(table)
+    target.close()
+    del target, writer
+    return segment, ("shm", segment.name, size)
+
+
+#Map a published frame, or an Arrow file on disk, without copying it; numeric columns are read-only views of the mapping
+def attach_frame(handle):
+    """Return (df, segment): a DataFrame backed by the shared segment, and the segment to release once `df` is gone."""
+    kind, name, size = handle
+    path = name if kind == "file" else _segment_path(name)
+    if path is not None:
+        #The mapping is closed by Arrow once the last column using it is gone, so there's no segment to release
+        source, segment = pa.memory_map(path, "r"), None
+    else:
+        if sys.version_info >= (3, 13):
+            segment = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            segment = shared_memory.SharedMemory(name=name)
+        source = pa.BufferReader(pa.py_buffer(segment.buf)[:size])
+    table = pa.ipc.open_file(source).read_all()
+    return table.to_pandas(split_blocks=True), segment
+
+
+#Close a segment, or the publisher's copy of it, once nothing uses it any more
+def release_segment(segment, unlink=False):
+    """Unmap `segment` (and remove it if `unlink`); a mapping still referenced by live frames stays until they're gone."""
+    if segment is None:
+        return
+    if unlink:
+        segment.unlink()
+    gc.collect()
+    try:
+        segment.close()
+    except BufferError:
+        pass
@@ -4,10 +4,11 @@
 #Import packages
 import streamlit as st
 import pandas as pd
-import os, pickle
-from openai import OpenAI
+import os
 import numpy as np
 import altair as alt
+from data_store import dataset_exists, load_dataset
+from llm_scheduler import get_llm_scheduler
 
 #Enable Altair VegaFusion data transformer for efficient chart rendering
 alt.data_transformers.enable("vegafusion")
@@ -17,7 +18,7 @@ with open("openai_key.txt") as f:
     my_api_key = f.read().strip()
 
 #Initialize OpenAI client with your API key
-client = OpenAI(api_key=my_api_key)
+client = get_llm_scheduler(my_api_key)
 
 #Configure page
 st.set_page_config(page_title="Hotel Dashboard", layout="wide")
@@ -30,13 +31,12 @@ CHART_DIR = "charts"
 os.makedirs(CHART_DIR, exist_ok=True)
 
 #Check if cleaned dataset exists, stop app if not found
-if not os.path.exists("cleaned_data_final.pkl"):
+if not dataset_exists():
     st.error("No cleaned dataset found. Please complete previous lessons first.")
     st.stop()
 
-#Load cleaned dataset from pickle file
-with open("cleaned_data_final.pkl", "rb") as f:
-    df = pickle.load(f)
+#Load cleaned dataset through the shared cache, only re-reading the file when it changes
+df = load_dataset()
 
 #Add subheader for cleaned data preview
 st.subheader("Cleaned Data Preview")
@@ -4,9 +4,10 @@
 #Import packages
 import streamlit as st
 import pandas as pd
-import os, pickle
+import os
 import altair as alt
-from openai import OpenAI
+from data_store import dataset_exists, load_dataset
+from llm_scheduler import get_llm_scheduler
 
 #Enable Altair VegaFusion data transformer for efficient chart rendering
 alt.data_transformers.enable("vegafusion")
@@ -16,7 +17,7 @@ with open("openai_key.txt") as f:
     my_api_key = f.read().strip()
 
 #Initialize OpenAI client with your API key
-client = OpenAI(api_key=my_api_key)
+client = get_llm_scheduler(my_api_key)
 
 #Configure page
 st.set_page_config(page_title="Hotel Dashboard", layout="wide")
@@ -25,16 +26,15 @@ st.set_page_config(page_title="Hotel Dashboard", layout="wide")
 st.title("Interactive Hotel Dashboard")
 
 #Check for cleaned dataset, stop if missing
-if not os.path.exists("cleaned_data_final.pkl"):
+if not dataset_exists():
     st.error("No cleaned dataset found. Please complete previous lessons first.")
     st.stop()
 
-#Load cleaned dataset from pickle file
-with open("cleaned_data_final.pkl", "rb") as f:
-    df_full = pickle.load(f)
+#Load cleaned dataset through the shared cache, only re-reading the file when it changes
+df_full = load_dataset()
 
-#Copy full dataset for filtering
-df = df_full.copy()
+#Start filtering from the full dataset (filters always build new frames, so no copy is needed)
+df = df_full
 
 #Create sidebar for dynamic filters
 st.sidebar.header("Choose Filters to Display")
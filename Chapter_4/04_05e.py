@@ -3,19 +3,43 @@
 
 #Import packages
 import pandas as pd
-import os, pickle
+import io, os, pickle, json, logging, sys, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer, ThreadingHTTPServer
+from openai import OpenAI
 import altair as alt
 import pytest
+from data_store import atomic_path, dataset_exists, dataset_version, link_dataset, load_dataset, save_dataset
+from filter_engine import FilterEngine
+from column_stats import column_catalog
+from chart_registry import build_charts, chart_fields, load_charts
+from chart_aggregation import plan_aggregation
+from chart_cache import ChartCache, filter_state_key
+from llm_stream import stream_completion
+from chat_context import ChatContext, count_message_tokens
+from expression_cache import ExpressionCache, normalize_question
+from result_cache import ResultCache, expression_hash
+from llm_client import make_async_openai_client
+from llm_scheduler import LLMScheduler
+from event_log import BoundedQueueHandler, EventLog, get_event_log, tail_lines
+from rerun_profiler import RerunProfiler
+
+#Make the Chapter_3 cleaning modules in the folder one level up importable
+sys.path.append(os.path.join(os.path.dirname(os.getcwd()), "Chapter_3"))
+from code_worker import CodeWorker
+from cleaning_log import CleaningLog
+import excel_ingest
+from excel_ingest import file_digest, read_merged_workbooks, read_workbook
+from shared_frame import SHM_DIR, attach_frame, publish_frame, release_segment
 
 #Test the cleaned dataset exists and loads correctly
 def test_cleaned_data_load():
     """Check that cleaned dataset exists, loads successfully, and contains expected columns."""
     #Confirm the pickle file exists
-    assert os.path.exists("cleaned_data_final.pkl"), "Missing cleaned dataset."
+    assert dataset_exists(), "Missing cleaned dataset."
 
-    #Load the dataset from the pickle file
-    with open("cleaned_data_final.pkl", "rb") as f:
-        df = pickle.load(f)
+    #Load the dataset through the shared dataset loader
+    df = load_dataset()
 
     #Verify the dataset is not empty
     assert not df.empty, "Loaded DataFrame is empty."
@@ -24,6 +48,256 @@ def test_cleaned_data_load():
     assert "Hotel ID" in df.columns, "Expected column 'Hotel ID' missing."
 
 
+#Test the dataset loader reuses one cached frame until the file changes
+def test_dataset_cache_reload(tmp_path):
+    """Check that loads share a single cached frame per file version and pick up rewritten files."""
+    path = str(tmp_path / "data.pkl")
+
+    #Save a small dataset and load it twice
+    with open(path, "wb") as f:
+        pickle.dump(pd.DataFrame({"Hotel ID": ["LH-1", "LH-2"], "Profit": [1, 2]}), f)
+    first, second = load_dataset(path), load_dataset(path)
+
+    #Confirm both loads share the same underlying data and that edits to one copy don't leak into the cache
+    assert first["Profit"].sum() == second["Profit"].sum() == 3
+    first.loc[0, "Profit"] = 100
+    assert load_dataset(path)["Profit"].sum() == 3
+
+    #Rewrite the file with a different size and confirm the new contents are loaded
+    version = dataset_version(path)
+    with open(path, "wb") as f:
+        pickle.dump(pd.DataFrame({"Hotel ID": ["LH-1", "LH-2", "LH-3"], "Profit": [1, 2, 3]}), f)
+    assert dataset_version(path) != version
+    assert load_dataset(path)["Profit"].sum() == 6
+
+#Test the columnar dataset store round-trips data and reads only the requested columns
+def test_dataset_column_projection(tmp_path):
+    """Check that a saved dataset loads back unchanged and that column projection returns only those columns."""
+    path = str(tmp_path / "data.arrow")
+    df = pd.DataFrame({"Hotel ID": ["LH-1", "LH-2"], "Year": [2018, 2019], "Profit": [1.5, None]})
+    save_dataset(df, path)
+
+    #Confirm the full dataset matches what was saved
+    pd.testing.assert_frame_equal(load_dataset(path), df, check_dtype=False, check_column_type=False)
+
+    #Confirm a projection keeps only the requested columns, in the requested order
+    assert list(load_dataset(path, columns=["Profit", "Year"]).columns) == ["Profit", "Year"]
+
+#Test a dataset linked to a checkpoint loads the checkpoint until the dataset itself is rewritten
+def test_linked_dataset(tmp_path):
+    """Check that a reference file redirects loads to its target and that a newer saved copy takes precedence."""
+    path, checkpoint = str(tmp_path / "data.arrow"), str(tmp_path / "step.arrow")
+    save_dataset(pd.DataFrame({"Profit": [1, 2]}), checkpoint)
+    link_dataset(checkpoint, path)
+
+    #Confirm the link resolves to the checkpoint without writing a copy of it
+    assert dataset_exists(path) and not os.path.exists(path)
+    assert dataset_version(path)[0] == checkpoint
+    assert load_dataset(path)["Profit"].sum() == 3
+
+    #Save the dataset directly and confirm the newer file wins over the older link
+    time.sleep(0.01)
+    save_dataset(pd.DataFrame({"Profit": [5]}), path)
+    assert load_dataset(path)["Profit"].sum() == 5
+
+#Test concurrent writers get their own temporary files and a failed write leaves the old file in place
+def test_atomic_path(tmp_path):
+    """Check that temporary paths are unique, replace the target on success and are removed on failure."""
+    path = str(tmp_path / "data.arrow")
+    with atomic_path(path) as first, atomic_path(path) as second:
+        assert first != second and os.path.dirname(first) == str(tmp_path)
+    save_dataset(pd.DataFrame({"Profit": [1]}), path)
+    with pytest.raises(ValueError), atomic_path(path) as tmp_file:
+        open(tmp_file, "wb").write(b"partial")
+        raise ValueError("write failed")
+    assert os.listdir(tmp_path) == ["data.arrow"] and load_dataset(path)["Profit"].sum() == 1
+
+#Test the cleaning log applies steps against checkpoints, moves between them, and publishes the current one
+def test_cleaning_log(tmp_path):
+    """Check apply, undo, redo, re-applying an undone step, truncation, persistence, publishing and export."""
+    log = CleaningLog(str(tmp_path / "steps"))
+    worker = CodeWorker(timeout=60)
+    try:
+        #Start from the cleaned dataset; starting again from the same source doesn't look at the data
+        log.start(load_dataset(), source="v1")
+        log.start(None, source="v1")
+        latest = "df = df[df['Year'] == df['Year'].max()]"
+        first = log.apply(latest, worker)
+        second = log.apply("df = df.drop(columns=['Utilities'])", worker)
+        assert [step["code"] for _, step, _ in log.steps()] == [None, latest, second["code"]]
+        assert second["parent"] == first["hash"]
+        assert "Utilities" not in load_dataset(second["checkpoint"]).columns
+        assert len(load_dataset(second["checkpoint"])) == len(load_dataset(first["checkpoint"])) < len(load_dataset())
+
+        #Undo and redo only move the head, and undo stops at the starting data
+        assert log.undo() and log.head["hash"] == first["hash"]
+        assert log.redo() and log.head["hash"] == second["hash"] and not log.redo()
+        assert log.undo() and log.undo() and not log.undo() and log.head["code"] is None
+
+        #Re-applying an undone step redoes it without running the code again
+        assert log.apply(latest, worker)["hash"] == first["hash"] and len(log.steps()) == 3
+
+        #Applying new code after an undo drops the undone step and its checkpoint
+        replacement = log.apply("df = df.drop(columns=['Supplies'])", worker)
+        assert len(log.steps()) == 3 and not log.redo() and not os.path.exists(second["checkpoint"])
+
+        #The log is kept on disk, and publishing links a dataset to the current checkpoint
+        assert CleaningLog(str(tmp_path / "steps")).head == log.head
+        log.publish(str(tmp_path / "data.arrow"))
+        assert log.is_head(dataset_version(str(tmp_path / "data.arrow"))[0])
+        assert "Supplies" not in load_dataset(str(tmp_path / "data.arrow")).columns
+
+        #Exporting writes the current step to a pickle that loads without the log's files
+        log.export(str(tmp_path / "export.pkl"))
+        with open(tmp_path / "export.pkl", "rb") as f:
+            assert pickle.load(f).equals(load_dataset(replacement["checkpoint"]))
+    finally:
+        worker.close()
+
+#Test the code worker returns results, isolates the data from the code, and restarts after a hang
+def test_code_worker():
+    """Check result variables and their fallback, copy-on-write isolation, errors, and recovery from a timeout."""
+    df = pd.DataFrame({"Country": ["Germany", "Poland", "Germany"], "Profit": [1.0, 2.0, 3.0]})
+    worker = CodeWorker(timeout=5)
+    try:
+        #Results come from the first result variable found, or a message when there is none
+        assert worker.run("result = df['Profit'].sum()", df, "v1") == 6
+        assert worker.run("payroll_summary = 1\nexpenses_summary = 2", df, "v1") == 2
+        assert worker.run("total = 1", df, "v1") == "No result variable found."
+        assert isinstance(worker.run("result = lambda: None", df, "v1"), str)
+
+        #Code that changes df in place never changes the data held for the next run
+        worker.run("df['Profit'] = 0\ndf.loc[0, 'Country'] = 'France'", df, "v1")
+        assert worker.run("result = (df['Profit'].sum(), df.loc[0, 'Country'])", df, "v1") == (6, "Germany")
+
+        #Errors in the code are raised here, and a new data key loads the new frame
+        with pytest.raises(RuntimeError, match="KeyError"):
+            worker.run("result = df['Missing']", df, "v1")
+        assert worker.run("result = len(df)", df.head(1), "v2") == 1
+
+        #A hung run stops the worker, and the next run starts a fresh one with the data loaded again
+        worker.timeout = 0.5
+        with pytest.raises(TimeoutError):
+            worker.run("import time\ntime.sleep(10)", df, "v2")
+        worker.timeout = 30
+        assert worker.run("result = len(df)", df, "v2") == 3
+    finally:
+        worker.close()
+
+#Test a frame published to shared memory, or saved as an Arrow file, attaches unchanged and is cleaned up
+def test_shared_frame_round_trip(tmp_path):
+    """Check that attached frames equal the published one and that unlinking removes the segment."""
+    df = load_dataset()
+    segment, handle = publish_frame(df)
+    try:
+        attached, attached_segment = attach_frame(handle)
+        pd.testing.assert_frame_equal(attached, df)
+        del attached
+        release_segment(attached_segment)
+    finally:
+        release_segment(segment, unlink=True)
+    assert not os.path.exists(os.path.join(SHM_DIR, handle[1].lstrip("/")))
+
+    #An Arrow file on disk attaches the same way, without a segment to release
+    path = save_dataset(df.head(100), str(tmp_path / "frame.arrow"))
+    attached, attached_segment = attach_frame(("file", path, None))
+    assert attached_segment is None
+    pd.testing.assert_frame_equal(attached, df.head(100))
+
+#Test a workbook is parsed once, whether it is read from disk or uploaded with the same contents
+def test_ingest_cache(tmp_path, monkeypatch):
+    """Check that path, bytes and upload digests match and that later reads come from the cache without parsing."""
+    cache_dir = tmp_path / "cache"
+    monkeypatch.setattr(excel_ingest, "INGEST_CACHE_DIR", str(cache_dir))
+    path = tmp_path / "locations.xlsx"
+    pd.DataFrame({"Hotel ID": ["LH-1", "LH-2"], "City": ["Berlin", "Warsaw"]}).to_excel(path, index=False)
+    first = read_workbook(str(path))
+    assert len(os.listdir(cache_dir)) == 1
+
+    #Parsing again would fail, so an upload of the same bytes must be served from the same cache entry
+    def no_parsing(*args, **kwargs):
+        raise AssertionError("workbook parsed again")
+    monkeypatch.setattr(pd, "read_excel", no_parsing)
+    upload = io.BytesIO(path.read_bytes())
+    upload.name = "locations.xlsx"
+    assert file_digest(upload) == file_digest(str(path)) == file_digest(path.read_bytes())
+    pd.testing.assert_frame_equal(read_workbook(upload), first)
+    pd.testing.assert_frame_equal(read_workbook(str(path)), first)
+    assert len(os.listdir(cache_dir)) == 1
+
+    #Different contents get their own entry
+    csv_path = tmp_path / "locations.csv"
+    csv_path.write_text("Hotel ID,City\nLH-3,Paris\n", encoding="utf-8")
+    assert read_workbook(str(csv_path))["City"].tolist() == ["Paris"]
+    assert len(os.listdir(cache_dir)) == 2
+
+#Test the streamed merge of two files matches pandas' outer merge, for workbooks and CSV files alike
+@pytest.mark.parametrize("suffix", [".xlsx", ".csv"])
+@pytest.mark.parametrize("unique_locations", [True, False])
+def test_streamed_merge_matches_pandas(tmp_path, monkeypatch, suffix, unique_locations):
+    """Check multi-batch merges against pd.merge(how="outer") with unmatched rows on both sides and repeated keys."""
+    monkeypatch.setattr(excel_ingest, "INGEST_CACHE_DIR", str(tmp_path / "cache"))
+    #Hotels LH-10 and LH-11 have no location, and LH-20 and LH-21 have no revenue
+    rev_exp = pd.DataFrame({
+        "Hotel ID": [f"LH-{i % 12}" for i in range(23)], "Year": [2015 + i // 12 for i in range(23)],
+        "Revenue": [1000.0 + i for i in range(23)], "Notes": [f"rev {i}" for i in range(23)],
+    })
+    location_ids = [f"LH-{i}" for i in range(10)] + ["LH-20", "LH-21"] + ([] if unique_locations else ["LH-1", "LH-3"])
+    location = pd.DataFrame({
+        "Hotel ID": location_ids, "City": [f"City {i}" for i in range(len(location_ids))],
+        "Notes": [f"loc {i}" for i in range(len(location_ids))],
+    })
+    paths = []
+    for name, frame in (("rev_exp", rev_exp), ("location", location)):
+        path = str(tmp_path / (name + suffix))
+        frame.to_csv(path, index=False) if suffix == ".csv" else frame.to_excel(path, index=False)
+        paths.append(path)
+
+    #Stream the revenue file five rows at a time, reporting progress after each batch
+    batches = []
+    merged, key = read_merged_workbooks(*paths, batch_rows=5, progress=lambda fraction, rows: batches.append(rows))
+    expected = pd.merge(rev_exp, location, on="Hotel ID", how="outer")
+    assert list(merged.columns) == list(expected.columns) == ["Hotel ID", "Year", "Revenue", "Notes_x", "City", "Notes_y"]
+    assert len(batches) == 5 and sum(batches) == len(expected) - 2
+    order = ["Hotel ID", "Year", "Notes_x", "Notes_y"]
+    pd.testing.assert_frame_equal(
+        merged.sort_values(order).reset_index(drop=True), expected.sort_values(order).reset_index(drop=True),
+        check_dtype=False,
+    )
+
+    #The merged result is cached under a key that only changes with the files' contents
+    assert read_merged_workbooks(*paths, batch_rows=5)[1] == key
+
+#Test the filter engine selects the same rows as chained pandas filters
+def test_filter_engine_matches_pandas():
+    """Check that combined range and category filters match the equivalent pandas boolean masks."""
+    df = load_dataset()
+    engine = FilterEngine()
+    low, high = df["Profit"].quantile(0.25), df["Profit"].quantile(0.75)
+    countries = df["Country"].dropna().unique().tolist()[:2]
+
+    #Apply the filters with the engine and with plain pandas
+    filtered = engine.apply(df, {"Profit": (low, high)}, {"Country": countries})
+    expected = df[(df["Profit"] >= low) & (df["Profit"] <= high) & df["Country"].isin(countries)]
+
+    #Confirm both approaches select the same rows, and that no filters returns the full dataset
+    assert filtered.index.equals(expected.index)
+    assert engine.apply(df) is df
+
+#Test the column statistics catalog matches values computed directly from the dataset
+def test_column_catalog():
+    """Check that cached min/max values and sorted category options agree with pandas."""
+    df = load_dataset()
+    catalog = column_catalog()
+
+    #Confirm every column is described
+    assert list(catalog) == list(df.columns)
+
+    #Confirm numeric ranges and categorical options match the dataset
+    assert catalog["Profit"]["min"] == df["Profit"].min() and catalog["Profit"]["max"] == df["Profit"].max()
+    assert list(catalog["Country"]["value_counts"]) == sorted(df["Country"].dropna().unique().tolist())
+    assert sum(catalog["Country"]["value_counts"].values()) == df["Country"].notna().sum()
+
 #Test that chart files exist in the 'charts' directory
 def test_chart_files_exist():
     """Verify that at least one chart file exists in the charts directory."""
@@ -48,8 +322,7 @@ def test_chart_execution(chart_file):
         code = f.read()
 
     #Load the cleaned dataset for use during chart execution
-    with open("cleaned_data_final.pkl", "rb") as f:
-        df = pickle.load(f)
+    df = load_dataset()
 
     #Initialize local variables for exec environment
     local_vars = {"df": df, "alt": alt}
@@ -67,6 +340,153 @@ def test_chart_execution(chart_file):
         pytest.fail(f"{chart_file} failed to execute: {e}")
 
 
+#Test the chart registry compiles each chart file once and builds every chart
+def test_chart_registry():
+    """Check that compiled charts are reused between loads and produce Altair charts with timings."""
+    compiled = load_charts("charts")
+
+    #Confirm unchanged files are served from the compiled cache
+    assert all(compiled[name] is chart for name, chart in load_charts("charts").items())
+
+    #Confirm every chart builds without errors and reports its timings
+    charts, errors, timings = build_charts(compiled, load_dataset())
+    assert not errors, f"Charts failed to build: {errors}"
+    assert all(isinstance(chart, alt.TopLevelMixin) for chart in charts.values())
+    assert set(timings) == set(compiled)
+
+#Test that the fields read by the charts are known only when every chart is a template
+def test_chart_fields(tmp_path):
+    """Check that chart fields cover templated charts and are unknown once any chart runs code on the data."""
+    (tmp_path / "a_bar.py").write_text("chart = alt.Chart(df).mark_bar().encode(x='Country', y='sum(Profit)')", encoding="utf-8")
+    assert chart_fields(load_charts(str(tmp_path))) == {"Country", "Profit"}
+    (tmp_path / "b_melt.py").write_text(
+        "chart = alt.Chart(df.melt(id_vars='Year')).mark_line().encode(x='Year:O', y='value')", encoding="utf-8")
+    assert chart_fields(load_charts(str(tmp_path))) is None
+
+#Test that building charts concurrently isolates failing and hanging charts and keeps the file order
+def test_parallel_chart_building(tmp_path):
+    """Check that a chart pool returns charts in file order while reporting broken and slow charts as errors."""
+    chart_files = {
+        "a_bar.py": "chart = alt.Chart(df).mark_bar().encode(x='Country', y='sum(Profit)')",
+        "b_broken.py": "chart = alt.Chart(df).mark_bar().encode(x=undefined_name)",
+        "c_slow.py": "import time\ntime.sleep(3)\nchart = alt.Chart(df).mark_line()",
+        "d_line.py": "chart = alt.Chart(df.head(10)).mark_line().encode(x='Year:O', y='Profit')",
+    }
+    for fname, code in chart_files.items():
+        (tmp_path / fname).write_text(code, encoding="utf-8")
+    compiled = load_charts(str(tmp_path))
+
+    charts, errors, timings = build_charts(compiled, load_dataset(), max_workers=4, timeout=0.5)
+    assert list(charts) == ["a_bar", "d_line"]
+    assert list(timings) == list(compiled)
+    assert isinstance(errors["b_broken.py"], NameError)
+    assert isinstance(errors["c_slow.py"], TimeoutError)
+
+#Test that charts queued behind others on the shared pool get their full timeout once they start
+def test_queued_charts_get_their_own_timeout(tmp_path):
+    """Check that charts waiting for a pool thread don't time out, and that reruns reuse one pool."""
+    for i in range(4):
+        (tmp_path / f"slow_{i}.py").write_text("import time\ntime.sleep(0.4)\nchart = alt.Chart(df).mark_bar()", encoding="utf-8")
+    compiled = load_charts(str(tmp_path))
+
+    #Two workers run the four charts in two waves, so the second wave finishes after 0.8 s
+    charts, errors, _ = build_charts(compiled, load_dataset(), max_workers=2, timeout=0.6)
+    assert not errors and len(charts) == 4
+
+    #A second rerun runs on the same threads instead of starting new ones
+    chart_threads = lambda: {t for t in threading.enumerate() if t.name.startswith("chart")}
+    before = chart_threads()
+    build_charts(compiled, load_dataset(), max_workers=2, timeout=0.6)
+    assert chart_threads() == before
+
+#Test that charts built for a filter state are reused, and evicted once the cache outgrows its byte budget
+def test_chart_cache():
+    """Check chart cache hits for a repeated filter state and size-based eviction of old entries."""
+    df = load_dataset()
+    compiled = load_charts("charts")
+    version = dataset_version("cleaned_data_final.arrow")
+
+    #The same filters in a different order give the same key; a changed range gives a new one
+    key = filter_state_key(version, df.columns, {"Profit": (0, 1e7)}, {"Country": ["Poland", "Germany"]})
+    assert key == filter_state_key(version, df.columns, {"Profit": (0.0, 1e7)}, {"Country": ["Germany", "Poland"]})
+    assert key != filter_state_key(version, df.columns, {"Profit": (0, 2e7)}, {"Country": ["Poland", "Germany"]})
+
+    #The second build for the same state is served entirely from the cache
+    cache = ChartCache()
+    first, _, _ = build_charts(compiled, df, cache=cache, state_key=key)
+    second, errors, timings = build_charts(compiled, df, cache=cache, state_key=key)
+    assert not errors and all(timing["cached"] for timing in timings.values())
+    assert all(second[name] is first[name] for name in first)
+
+    #Charts sharing one frame count its bytes once, and the bytes are released with the last chart holding it
+    shared = ChartCache()
+    shared.put("a", key, alt.Chart(df).mark_bar())
+    one_chart = shared.nbytes
+    shared.put("b", key, alt.Chart(df).mark_line())
+    assert one_chart < shared.nbytes < 2 * one_chart
+    shared.put("a", key, alt.Chart(df.head(1)).mark_bar())
+    assert shared.nbytes > one_chart
+    shared.put("b", key, alt.Chart(df.head(1)).mark_line())
+    assert shared.nbytes < one_chart
+
+    #A budget smaller than the whole cache can't hold every chart, so the oldest are evicted
+    cache = ChartCache(max_bytes=cache.nbytes - 1)
+    build_charts(compiled, df, cache=cache, state_key=key)
+    assert 0 < len(cache) < len(compiled) and cache.nbytes <= cache.max_bytes
+
+#Test charts bound from data-less templates match charts built directly from the data
+def test_chart_templates_match_direct_execution():
+    """Check that each template-bound chart has the same spec as running its file against the dataset."""
+    df = load_dataset()
+    compiled = load_charts("charts")
+    charts, _, timings = build_charts(compiled, df)
+
+    for name, chart in compiled.items():
+        #Build the chart the original way
+        local_vars = {"df": df, "alt": alt}
+        exec(chart.code, {}, local_vars)
+
+        #Compare the specs without their inline datasets, which templates trim and pre-aggregate per view
+        bound, direct = charts[name].to_dict(), local_vars["chart"].to_dict()
+        for spec in (bound, direct):
+            spec.pop("datasets")
+            spec.pop("data", None)
+            for view in spec.get("layer", []):
+                view.pop("data", None)
+        assert timings[name]["template"], f"{name} was not built from a template"
+        assert bound == direct, f"{name} template spec differs from direct execution"
+
+
+#Test that pre-aggregated chart data holds the same totals as grouping the full dataset
+def test_chart_pre_aggregation():
+    """Check that template-bound charts receive one row per group with the totals Vega-Lite would compute."""
+    df = load_dataset()
+    charts, _, _ = build_charts(load_charts("charts"), df)
+
+    for name, chart in charts.items():
+        #Each single view that got its own rows should only hold aggregated rows
+        for view in [chart] + list(chart._get("layer", [])):
+            data = view._get("data")
+            if not isinstance(data, pd.DataFrame) or len(data) == len(df):
+                continue
+            plan = plan_aggregation(view)
+            assert plan is not None, f"{name} has pre-aggregated data without a plan"
+            expected = df.groupby(plan.keys).agg(plan.measures).sort_index()
+            actual = data.set_index(plan.keys)[list(plan.measures)].sort_index()
+            pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+
+#Test that a chart with an argmax aggregate is built from the raw rows instead of breaking the dashboard
+def test_argmax_chart_is_not_pre_aggregated(tmp_path):
+    """Check that argmax charts get no aggregation plan, keep the field they compare by, and still build."""
+    (tmp_path / "best_year.py").write_text(
+        "chart = alt.Chart(df).mark_bar().encode(x='Country:N', y=alt.Y('Year:O', aggregate={'argmax': 'Profit'}))",
+        encoding="utf-8")
+    compiled = load_charts(str(tmp_path))
+    assert chart_fields(compiled) == {"Country", "Year", "Profit"}
+    charts, errors, _ = build_charts(compiled, load_dataset())
+    assert not errors and len(charts["best_year"]._get("data")) == len(load_dataset())
+    assert plan_aggregation(charts["best_year"]) is None
+
 #Test that the AI-generated dashboard layout file exists
 def test_layout_file_exists():
     """Check that the dashboard layout file created by AI exists."""
@@ -140,4 +560,271 @@ def test_layout_execution():
         exec(layout_code, {}, charts | {"st": DummyStreamlit()})
     except Exception as e:
         #Fail test if execution raises an error
-        pytest.fail(f"Dashboard layout failed to execute: {e}")
\ No newline at end of file
+        pytest.fail(f"Dashboard layout failed to execute: {e}")
+
+
+#Test that long chat sessions are sent as a summary plus a recent window that fits the token budget
+def test_chat_context_budget():
+    """Check that the assistant's request stays within budget, keeps the latest question and summarizes older turns."""
+    context = ChatContext(budget=300, summary_budget=80)
+    history = []
+    sizes = []
+    for i in range(50):
+        history.append({"role": "user", "content": f"Question {i}: what was the total profit for hotel LH-{i} last year?"})
+        history.append({"role": "assistant", "content": str(1000000 + i)})
+        messages = context.messages("You are a hotel dashboard assistant.", history)
+        sizes.append(count_message_tokens(messages))
+        assert messages[-1] == history[-1]
+        assert sizes[-1] <= context.budget
+
+    #Older turns live on in the summary instead of being sent in full
+    assert messages[1]["content"].startswith("Summary of the earlier conversation")
+    assert "Question 0" not in str(messages[2:])
+    assert max(sizes[-10:]) - min(sizes[-10:]) < 50
+
+#Test that repeated or reworded questions reuse a cached expression, and that old entries are evicted
+def test_expression_cache(tmp_path):
+    """Check expression cache hits for reworded questions, misses for other entities, keys, operators, orders and schemas."""
+    cache = ExpressionCache(str(tmp_path / "cache.sqlite"), max_entries=2)
+    cache.put("What is the total revenue?", "schema-a", "df['Revenue'].sum()")
+
+    #Rewordings that only differ in case, punctuation, plurals and filler words hit the cache
+    assert normalize_question("What is the TOTAL revenue??") == normalize_question("What's the total revenue") == "total revenue"
+    assert cache.get("total revenue", "schema-a") == "df['Revenue'].sum()"
+    assert cache.get("Please show me the total revenues", "schema-a") == "df['Revenue'].sum()"
+
+    #Other schemas and questions about different numbers miss
+    cache.put("Total revenue in 2019", "schema-a", "df[df['Year'] == 2019]['Revenue'].sum()")
+    assert cache.get("total revenue", "schema-b") is None
+    assert cache.get("Total revenue in 2020", "schema-a") is None
+    assert (cache.hits, cache.misses) == (2, 2)
+
+    #Questions naming a different country or grouping by a different column miss
+    big = ExpressionCache(str(tmp_path / "big.sqlite"))
+    big.put("What is the average annual payroll for hotels located in Germany?", "schema-a",
+            "df[df['Country']=='Germany']['Annual payroll'].mean()")
+    big.put("Total taxes and license fees by country", "schema-a", "df.groupby('Country')['Taxes'].sum()")
+    assert big.get("What is the average annual payroll for hotels located in France?", "schema-a") is None
+    assert big.get("Total taxes and license fees by city", "schema-a") is None
+    assert big.get("Total taxes and license fees by countries", "schema-a") == "df.groupby('Country')['Taxes'].sum()"
+
+    #Questions with another comparison, or the same words in another order, miss
+    big.put("How many hotels have profit > 100000?", "schema-a", "(df['Profit'] > 100000).sum()")
+    big.put("Revenue minus payroll", "schema-a", "df['Revenue'] - df['Payroll']")
+    assert big.get("How many hotels have profit < 100000?", "schema-a") is None
+    assert big.get("Payroll minus revenue", "schema-a") is None
+    assert big.get("how many hotels have profits > 100000", "schema-a") == "(df['Profit'] > 100000).sum()"
+
+    #The size limit evicts the least recently used entry, and expired entries are never returned
+    cache.put("Average profit by country", "schema-a", "df.groupby('Country')['Profit'].mean()")
+    assert len(cache) == 2 and cache.get("total revenue", "schema-a") is None
+    cache.ttl = -1
+    assert cache.get("Average profit by country", "schema-a") is None
+
+#Test that evaluated results are keyed on the expression's syntax and the filter state
+def test_result_cache():
+    """Check that reformatted expressions share a result, other filter states don't, and old results are evicted."""
+    assert expression_hash("df['Profit'].sum()") == expression_hash(' df["Profit"].sum( ) ')
+    assert expression_hash("df['Profit'].sum()") != expression_hash("df['Profit'].mean()")
+    with pytest.raises(SyntaxError):
+        expression_hash("x = df['Profit']")
+
+    cache = ResultCache(max_entries=2)
+    key = expression_hash("df['Profit'].sum()")
+    cache.put(key, "all rows", "156776762")
+    assert cache.get(key, "all rows") == "156776762"
+    assert cache.get(key, "Germany only") is None
+
+    #The least recently used result is dropped once the cache is full
+    cache.put(key, "Germany only", "19601146")
+    cache.put(key, "Poland only", "19645662")
+    assert cache.get(key, "all rows") is None and cache.get(key, "Poland only") == "19645662"
+
+#Test that the pooled OpenAI client gets its timeout and retry settings
+def test_pooled_openai_client():
+    """Check that the client factory applies its timeout and retry settings."""
+    client = make_async_openai_client("sk-test", timeout=30, max_retries=4)
+    assert client.max_retries == 4 and client.timeout.read == 30
+
+#Stand-in for the OpenAI chat completions endpoint that streams a fixed reply as server-sent events
+class _StreamingCompletionHandler(BaseHTTPRequestHandler):
+    tokens = ["df", "['Profit']", ".sum()"]
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        assert body["stream"] is True
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for token in [""] + self.tokens:
+            chunk = {"id": "c1", "object": "chat.completion.chunk", "created": 0, "model": body["model"],
+                     "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def log_message(self, *args):
+        pass
+
+
+#Test that streamed completions arrive token by token from an OpenAI-compatible server
+def test_stream_completion():
+    """Check that the assistant's streaming helper yields each token in order and records its latency."""
+    server = HTTPServer(("127.0.0.1", 0), _StreamingCompletionHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        client = OpenAI(api_key="sk-test", base_url=f"http://127.0.0.1:{server.server_port}/v1")
+        stats = {}
+        tokens = list(stream_completion(client, [{"role": "user", "content": "Total profit?"}], stats=stats))
+        assert tokens == _StreamingCompletionHandler.tokens
+        assert 0 <= stats["first_token_ms"] <= stats["total_ms"]
+    finally:
+        server.shutdown()
+
+
+#Stand-in for the OpenAI chat completions endpoint that rate-limits the first requests and records concurrency
+class _RateLimitedCompletionHandler(BaseHTTPRequestHandler):
+    lock = threading.Lock()
+    state = {"requests": 0, "active": 0, "max_active": 0}
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        with self.lock:
+            self.state["requests"] += 1
+            limited = self.state["requests"] <= 2
+            self.state["active"] += 1
+            self.state["max_active"] = max(self.state["max_active"], self.state["active"])
+        time.sleep(0.05)
+        if limited:
+            body, status = {"error": {"message": "Rate limit reached", "type": "rate_limit"}}, 429
+        else:
+            body, status = {"id": "c1", "object": "chat.completion", "created": 0, "model": "gpt-3.5-turbo",
+                            "choices": [{"index": 0, "finish_reason": "stop",
+                                         "message": {"role": "assistant", "content": "df['Profit'].sum()"}}]}, 200
+        with self.lock:
+            self.state["active"] -= 1
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        if limited:
+            self.send_header("Retry-After", "0")
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+#Test that the request scheduler limits concurrency, retries rate-limited requests and reports its queue
+def test_llm_scheduler():
+    """Check that queued completions all succeed despite 429s without exceeding the concurrency limit."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _RateLimitedCompletionHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        base_url = f"http://127.0.0.1:{server.server_port}/v1"
+        scheduler = LLMScheduler(make_async_openai_client("sk-test", base_url, max_retries=0), max_concurrency=3)
+        messages = [{"role": "user", "content": "Total profit?"}]
+        with ThreadPoolExecutor(max_workers=10) as pool:
+            replies = list(pool.map(
+                lambda _: scheduler.chat.completions.create(model="gpt-3.5-turbo", messages=messages), range(10)
+            ))
+        assert all(reply.choices[0].message.content == "df['Profit'].sum()" for reply in replies)
+        assert _RateLimitedCompletionHandler.state["max_active"] <= 3
+
+        metrics = scheduler.metrics()
+        assert metrics["completed"] == 10 and metrics["rate_limited"] == 2 and metrics["retries"] == 2
+        assert metrics["queued"] == 0 and metrics["in_flight"] == 0 and metrics["tokens_last_minute"] > 0
+
+        #Streamed replies also go through the scheduler
+        server.RequestHandlerClass = _StreamingCompletionHandler
+        tokens = list(stream_completion(scheduler, messages))
+        assert tokens == _StreamingCompletionHandler.tokens
+    finally:
+        server.shutdown()
+
+#Test the event log rotates files by size and reads back only the newest events of each type
+def test_event_log_tail(tmp_path):
+    """Check that tails return the newest events in order, per type and across types, including rotated files."""
+    log = EventLog(str(tmp_path), max_bytes=4096, backup_count=3)
+    for i in range(200):
+        log.log("filters" if i % 4 else "feedback", f"event {i}", index=i)
+    log.flush()
+
+    #Confirm the filter events were rotated and the tail reaches back across the rotation
+    assert os.path.exists(tmp_path / "filters.jsonl.1")
+    assert [e["index"] for e in log.tail(5, event_type="feedback")] == [180, 184, 188, 192, 196]
+    assert [e["index"] for e in log.tail(60, event_type="filters")] == [i for i in range(200) if i % 4][-60:]
+    assert [e["message"] for e in log.tail(3)] == ["event 197", "event 198", "event 199"]
+
+    #Confirm the reverse reader returns whole lines, whatever the block boundaries
+    path = tmp_path / "lines.txt"
+    path.write_text("".join(f"line {i}\n" for i in range(5000)))
+    assert tail_lines(str(path), 3) == [b"line 4997", b"line 4998", b"line 4999"]
+    assert len(tail_lines(str(path), 10000)) == 5000
+
+    #Confirm a half-written last event and a damaged line are left out rather than failing the read
+    with open(tmp_path / "feedback.jsonl", "a", encoding="utf-8") as f:
+        f.write('not json\n{"time": "2099-01-01T00:00:00.000", "level": "INFO", "type": "feedback", "mess')
+    assert [e["index"] for e in log.tail(2, event_type="feedback")] == [192, 196]
+    log.close()
+
+#Test clearing the cached event log stops the old writer instead of leaving two writing the same files
+def test_event_log_after_cache_clear(tmp_path):
+    """Check that the log recreated after a cache clear is the only writer and keeps events logged through the old one."""
+    writers = lambda: [t for t in threading.enumerate() if t.name == "event-log-writer"]
+    before = len(writers())
+    old_log = get_event_log(str(tmp_path))
+    old_log.log("feedback", "before clear")
+    get_event_log.clear()
+    new_log = get_event_log(str(tmp_path))
+    assert new_log is not old_log and len(writers()) == before + 1
+
+    #The old log's logger now hands events to the new writer
+    old_log.log("feedback", "after clear")
+    new_log.flush()
+    assert [e["message"] for e in new_log.tail(2, event_type="feedback")] == ["before clear", "after clear"]
+    new_log.close()
+
+#Test logging never waits on a full queue and counts the events it had to drop
+def test_event_queue_drops_when_full():
+    """Check that a full queue drops new events without blocking and counts each one."""
+    handler = BoundedQueueHandler(max_queued=2)
+    logger = logging.getLogger("test_event_queue_drops_when_full")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    logger.handlers = [handler]
+
+    #Log more events than the queue holds, with nothing draining it, and confirm the call returns at once
+    started = time.perf_counter()
+    for i in range(5):
+        logger.info(f"event {i}")
+    assert time.perf_counter() - started < 1
+    assert handler.queue.qsize() == 2 and handler.dropped == 3
+
+#Test the rerun profiler keeps per-stage timings, restarts them for new chart versions and exports them
+def test_rerun_profiler(tmp_path):
+    """Check stage summaries and histograms, the per-version reset and the exported metrics file."""
+    profiler = RerunProfiler(metrics_path=str(tmp_path / "metrics.json"), export_interval_s=3600)
+    for ms in (3, 4, 30):
+        timer = profiler.start()
+        with timer.stage("filters"):
+            pass
+        timer.record("chart: Profit", ms, version="v1")
+        timer.finish()
+
+    #Confirm each stage was recorded for every rerun and the chart timings land in the right buckets
+    stats = profiler.stats()
+    assert profiler.reruns == 3 and stats["filters"]["count"] == stats["total"]["count"] == 3
+    assert stats["chart: Profit"]["max_ms"] == 30 and stats["chart: Profit"]["histogram"]["≤5 ms"] == 2
+
+    #Confirm a new chart version starts fresh timings and keeps the old version's summary for comparison
+    timer = profiler.start()
+    timer.record("chart: Profit", 1, version="v2")
+    timer.finish()
+    chart = profiler.stats()["chart: Profit"]
+    assert chart["count"] == 1 and chart["previous"]["version"] == "v1" and chart["previous"]["count"] == 3
+
+    #Confirm the first rerun exported the metrics file and a manual export brings it up to date
+    assert json.load(open(profiler.export()))["reruns"] == 4
+
@@ -4,12 +4,14 @@
 #Import packages
 import streamlit as st
 import pandas as pd
-import os, pickle
-from openai import OpenAI
+import os
 import numpy as np
 import altair as alt
 import logging
 import traceback
+from data_store import dataset_exists, load_dataset
+from event_log import EVENT_TYPES, format_events, get_event_log
+from llm_scheduler import get_llm_scheduler
 
 #Enable Altair VegaFusion data transformer for efficient chart rendering
 alt.data_transformers.enable("vegafusion")
@@ -19,7 +21,7 @@ with open("openai_key.txt") as f:
     my_api_key = f.read().strip()
 
 #Initialize OpenAI client with your API key
-client = OpenAI(api_key=my_api_key)
+client = get_llm_scheduler(my_api_key)
 
 #Configure page
 st.set_page_config(page_title="Hotel Dashboard", layout="wide")
@@ -27,24 +29,20 @@ st.set_page_config(page_title="Hotel Dashboard", layout="wide")
 #Write title
 st.title("Interactive Hotel Dashboard")
 
-#Setup log file for dashboard events, feedback, and errors
-logging.basicConfig(
-    filename="dashboard_maintenance.log",
-    level=logging.INFO,
-    format="%(asctime)s %(levelname)s: %(message)s"
-)
+#Get the shared structured log for dashboard events, feedback, and errors, which keeps one rotating file per event type
+#and writes events from a background thread, so logging never slows down a rerun
+event_log = get_event_log()
 
 #Check for cleaned dataset, stop if missing
-if not os.path.exists("cleaned_data_final.pkl"):
+if not dataset_exists():
     st.error("No cleaned dataset found. Please complete previous lessons first.")
     st.stop()
 
-#Load cleaned dataset from pickle file
-with open("cleaned_data_final.pkl", "rb") as f:
-    df_full = pickle.load(f)
+#Load cleaned dataset through the shared cache, only re-reading the file when it changes
+df_full = load_dataset()
 
-#Copy full dataset for filtering
-df = df_full.copy()
+#Start filtering from the full dataset (filters always build new frames, so no copy is needed)
+df = df_full
 
 #Create sidebar for dynamic filters
 st.sidebar.header("Choose Filters to Display")
@@ -96,7 +94,8 @@ for col in selected_categorical:
     df = df[df[col].isin(sel_opts)]
 
 #Log applied filters
-logging.info(f"Filters applied - Numeric: {selected_numeric}, Categorical: {selected_categorical}")
+event_log.log("filters", f"Filters applied - Numeric: {selected_numeric}, Categorical: {selected_categorical}",
+              numeric=selected_numeric, categorical=selected_categorical)
 
 #Check for existing saved dashboard layout
 if not os.path.exists("dashboard_layout.py"):
@@ -146,7 +145,7 @@ if not charts:
     #Display Streamlit warning message if no charts are loaded into the dashboard
     st.warning("No saved charts found. Please generate charts first.")
     #Log this warning event to the log file
-    logging.warning("No saved charts found when dashboard ran.")
+    event_log.log("charts", "No saved charts found when dashboard ran.", level=logging.WARNING)
     #Stop the app execution since there’s nothing to display
     st.stop()
 
@@ -155,14 +154,12 @@ try:
     #Execute the AI-generated dashboard layout code, injecting charts and Streamlit into its local namespace
     exec(dashboard_layout_code, {}, charts | {"st": st})
     #Log a success message if the dashboard layout executes without errors
-    logging.info("Dashboard layout successfully executed.")
+    event_log.log("layout", "Dashboard layout successfully executed.")
 except Exception as e:
     #Display error message in the Streamlit UI if the layout execution fails
     st.error(f"Error running dashboard layout: {e}")
-    #Log the error message to the log file
-    logging.error(f"Error executing dashboard layout: {e}")
-    #Log the full traceback for debugging purposes
-    logging.error(traceback.format_exc())
+    #Log the error message to the log file, with the full traceback for debugging purposes
+    event_log.log("layout", f"Error executing dashboard layout: {e}", level=logging.ERROR, traceback=traceback.format_exc())
 
 #Add AI Chabot section in sidebar
 st.sidebar.header("AI Assistant")
@@ -245,14 +242,14 @@ st.sidebar.header("📣 Feedback")
 #Create thumbs-up feedback button
 if st.sidebar.button("👍 Dashboard looks great"):
     #Log positive feedback when user clicks thumbs-up
-    logging.info("User feedback: 👍 Dashboard looks great")
+    event_log.log("feedback", "User feedback: 👍 Dashboard looks great", rating="up")
     #Display thank you message in sidebar
     st.sidebar.success("Thank you for the positive feedback!")
 
 #Create thumbs-down feedback button
 if st.sidebar.button("👎 Needs improvement"):
     #Log negative feedback when user clicks thumbs-down
-    logging.info("User feedback: 👎 Needs improvement")
+    event_log.log("feedback", "User feedback: 👎 Needs improvement", rating="down")
     #Display thank you message for constructive feedback
     st.sidebar.info("Thanks, we’ll review your feedback.")
 
@@ -266,21 +263,22 @@ if st.sidebar.button("Submit Feedback"):
         st.sidebar.warning("Please enter your feedback before submitting.")
     else:
         #Log user’s written feedback to log file
-        logging.info(f"User written feedback: {feedback}")
+        event_log.log("feedback", f"User written feedback: {feedback}", comment=feedback)
         #Confirm feedback submission to user
         st.sidebar.success("Thank you, your feedback has been logged.")
 
 #Read and display recent log entries for dashboard activity and feedback
 with st.expander("Recent Log Entries"):
 
-    #Read last 10 lines of the dashboard maintenance log
-    if os.path.exists("dashboard_maintenance.log"):
-        #Open the log file and read its contents
-        with open("dashboard_maintenance.log") as f:
-            #Read only the last 10 lines for recent activity
-            lines = f.readlines()[-10:]
-        #Display last 10 log lines in a Streamlit code block
-        st.code("".join(lines))
+    #Choose which type of event to show
+    log_type = st.selectbox("Event type", ["all"] + list(EVENT_TYPES), key="log_event_type")
+    #Read only the last 10 events, seeking back from the end of the event files instead of reading them whole
+    events = event_log.tail(10, event_type=None if log_type == "all" else log_type)
+    if events:
+        #Display last 10 events in a Streamlit code block
+        st.code(format_events(events))
     else:
         #If log file doesn't exist yet, notify user
-        st.write("No log entries found yet.")
\ No newline at end of file
+        st.write("No log entries found yet.")
+    #Show how many events are still waiting to be written and how many were dropped because the queue was full
+    st.caption(f"{event_log.queued} events waiting to be written, {event_log.dropped} dropped")
\ No newline at end of file
@@ -4,282 +4,366 @@
 #Import packages
 import streamlit as st
 import pandas as pd
-import os, pickle
-from openai import OpenAI
+import os
 import numpy as np
 import altair as alt
 import logging
 import traceback
-
-#Enable Altair VegaFusion data transformer for efficient chart rendering
-alt.data_transformers.enable("vegafusion")
-
-#Gather API key
-my_api_key = os.getenv("OPENAI_API_KEY")
-
-#Initialize OpenAI client with your API key
-client = OpenAI(api_key=my_api_key)
-
-#Configure page
-st.set_page_config(page_title="Hotel Dashboard", layout="wide")
-
-#Write title
-st.title("Interactive Hotel Dashboard")
-
-#Setup log file for dashboard events, feedback, and errors
-logging.basicConfig(
-    filename="dashboard_maintenance.log",
-    level=logging.INFO,
-    format="%(asctime)s %(levelname)s: %(message)s"
-)
-
-#Check for cleaned dataset, stop if missing
-if not os.path.exists("cleaned_data_final.pkl"):
-    st.error("No cleaned dataset found. Please complete previous lessons first.")
-    st.stop()
-
-#Load cleaned dataset from pickle file
-with open("cleaned_data_final.pkl", "rb") as f:
-    df_full = pickle.load(f)
-
-#Copy full dataset for filtering
-df = df_full.copy()
-
-#Create sidebar for dynamic filters
-st.sidebar.header("Choose Filters to Display")
-
-#Identify numeric and categorical columns
-numeric_cols = df_full.select_dtypes(include="number").columns.tolist()
-cat_cols = df_full.select_dtypes(exclude="number").columns.tolist()
-
-#User multiselects to choose which numeric and categorical columns to show as filters
-selected_numeric = st.sidebar.multiselect("Numeric Filters", options=numeric_cols, default=[])
-selected_categorical = st.sidebar.multiselect("Categorical Filters", options=cat_cols, default=[])
-
-#Create sliders for selected numeric columns
-for col in selected_numeric:
-    #Determine minimum and maximum values for the current numeric column
-    min_val, max_val = float(df_full[col].min()), float(df_full[col].max())
-    #Add a slider to the sidebar for selecting a numeric value range
-    sel_range = st.sidebar.slider(
-        #Label for the slider
-        f"{col} Range",    
-        #Minimum possible value          
-        min_value=min_val,   
-        #Maximum possible value        
-        max_value=max_val,   
-        #Default slider range (full span)        
-        value=(min_val, max_val),  
-        #Unique key for this filter to track state  
-        key=f"filter_{col}"          
-    )
-    #Filter the dataset based on the selected slider range values
-    df = df[(df[col] >= sel_range[0]) & (df[col] <= sel_range[1])]
-
-#Create multiselects for selected categorical columns
-for col in selected_categorical:
-    #Retrieve sorted list of unique non-null options for the current categorical column
-    options = sorted(df_full[col].dropna().unique().tolist())
-    #Add a multiselect widget to the sidebar for selecting categories
-    sel_opts = st.sidebar.multiselect(
-        #Label for the multiselect
-        f"{col} Options", 
-        #Available selection options     
-        options=options, 
-        #Default selection (select all by default)      
-        default=options,       
-        #Unique key for this filter to track state
-        key=f"filter_{col}"    
-    )
-    #Filter the dataset based on the selected categories
-    df = df[df[col].isin(sel_opts)]
-
-#Log applied filters
-logging.info(f"Filters applied - Numeric: {selected_numeric}, Categorical: {selected_categorical}")
-
-#Check for existing saved dashboard layout
-if not os.path.exists("dashboard_layout.py"):
-    st.error("No dashboard layout found from previous lesson. Please complete the previous lesson first.")
-    st.stop()
-
-#Read in AI-generated layout code from file
-with open("dashboard_layout.py", "r", encoding="utf-8") as f:
-    dashboard_layout_code = f.read()
-
-#Load charts using the current filtered dataset
-CHART_DIR = "charts"
-os.makedirs(CHART_DIR, exist_ok=True)
-
-#Initialize dictionary for charts
-charts = {}
-
-#Loop through each file in the chart directory, sorted alphabetically
-for fname in sorted(os.listdir(CHART_DIR)):
-    #Check if the file is a Python file by confirming it ends with ".py"
-    if fname.lower().endswith(".py"):
-        #Open the chart Python file and read its code as a string
-        with open(os.path.join(CHART_DIR, fname), encoding="utf-8") as f:
-            code = f.read()
-        
-        #Create a local namespace with required objects for chart code execution
-        local_vars = {"df": df, "alt": alt}
-        
-        #Try to safely execute the chart code
-        try:
-            #Execute the code in an isolated local_vars context
-            exec(code, {}, local_vars)  
-            
-            #If a variable named 'chart' was created during code execution, store it in the charts dictionary
-            if "chart" in local_vars:
-                #Use the file name (without extension) as the chart's dictionary key
-                chart_key = os.path.splitext(fname)[0]
-                #Add the chart object to the charts dictionary
-                charts[chart_key] = local_vars["chart"]
-        
-        #If any error occurs while loading a chart file, display and log an error message
-        except Exception as e:
-            st.error(f"Failed to load {fname}: {e}")
-
-#Warn if no charts found
-if not charts:
-    #Display Streamlit warning message if no charts are loaded into the dashboard
-    st.warning("No saved charts found. Please generate charts first.")
-    #Log this warning event to the log file
-    logging.warning("No saved charts found when dashboard ran.")
-    #Stop the app execution since there’s nothing to display
-    st.stop()
-
-#Display charts in the arrangement specified by saved dashboard layout code
+from data_store import dataset_exists, dataset_schema, dataset_version, load_dataset, schema_fingerprint
+from event_log import EVENT_TYPES, format_events, get_event_log
+from filter_engine import get_filter_engine
+from column_stats import column_catalog, column_stats, summarize_columns
+from chart_registry import CHART_DIR, CHART_TIMEOUT_S, MAX_CHART_WORKERS, build_charts, chart_fields, load_charts
+from chart_cache import filter_state_key, get_chart_cache
+from llm_stream import stream_completion
+from chat_context import ChatContext, count_message_tokens
+from expression_cache import get_expression_cache
+from result_cache import expression_hash, get_result_cache
+from llm_scheduler import get_llm_scheduler
+from rerun_profiler import get_rerun_profiler, is_admin, render_timing_panel
+
+#Start timing this rerun's stages, which are added to the shared rolling timings when the rerun finishes
+rerun_timer = get_rerun_profiler().start()
+
+#Record the rerun's timings however it ends, including reruns stopped early by st.stop() or by an error
 try:
-    #Execute the AI-generated dashboard layout code, injecting charts and Streamlit into its local namespace
-    exec(dashboard_layout_code, {}, charts | {"st": st})
-    #Log a success message if the dashboard layout executes without errors
-    logging.info("Dashboard layout successfully executed.")
-except Exception as e:
-    #Display error message in the Streamlit UI if the layout execution fails
-    st.error(f"Error running dashboard layout: {e}")
-    #Log the error message to the log file
-    logging.error(f"Error executing dashboard layout: {e}")
-    #Log the full traceback for debugging purposes
-    logging.error(traceback.format_exc())
-
-#Add AI Chabot section in sidebar
-st.sidebar.header("AI Assistant")
-#Determine if chat history exists in the session state and initialize if it doesn't
-if "chat_history" not in st.session_state:
-    st.session_state.chat_history = []
-
-#Create text input field in sidebar to allow users to type in message
-user_input = st.sidebar.text_input(
-    "Ask a question about this hotel dashboard:",
-    key="ui_input"
-)
-
-#Check if send button is clicked
-if st.sidebar.button("Send", key="ui_send"):
-    if not user_input.strip():
-        #Provide warning if user has not entered any input
-        st.sidebar.warning("Please enter a question before sending.")
-    else:
-        #Add user's message to chat history
-        st.session_state.chat_history.append({"role": "user", "content": user_input})
-
-        #Build system prompt and add current chat history
-        messages = [
-            {
-                "role": "system",
-                "content": (
-                    "You are an assistant helping analyze a hotel performance dashboard. "
-                    "You have access to a filtered Pandas DataFrame called `df`. "
-                    "If the user's question asks for a numeric/statistical answer (e.g. totals, averages, counts), "
-                    "respond with a single valid Python expression using only built-in functions and pandas. "
-                    "Do NOT explain or add markdown. Return just the expression that would compute the answer.\n"
-                    "If the user asks about the structure of the data (e.g. column names, missing values, filters), "
-                    "return an appropriate code snippet to inspect the DataFrame structure (e.g. `df.columns`, `df.info()`, etc.)."
-                )
-            }
-        ] + st.session_state.chat_history
+    #Enable Altair VegaFusion data transformer for efficient chart rendering
+    alt.data_transformers.enable("vegafusion")
+
+    #Gather API key
+    my_api_key = os.getenv("OPENAI_API_KEY")
+
+    #Initialize OpenAI client with your API key
+    client = get_llm_scheduler(my_api_key)
+
+    #Configure page
+    st.set_page_config(page_title="Hotel Dashboard", layout="wide")
+
+    #Write title
+    st.title("Interactive Hotel Dashboard")
+
+    #Get the shared structured log for dashboard events, feedback, and errors, which keeps one rotating file per event type
+    #and writes events from a background thread, so logging never slows down a rerun
+    event_log = get_event_log()
+
+    #Check for cleaned dataset, stop if missing
+    if not dataset_exists():
+        st.error("No cleaned dataset found. Please complete previous lessons first.")
+        st.stop()
+
+    #Create sidebar for dynamic filters
+    st.sidebar.header("Choose Filters to Display")
+
+    #Read the dataset's column names and types without loading any data
+    with rerun_timer.stage("schema"):
+        schema = dataset_schema()
+
+    #Identify numeric and categorical columns
+    numeric_cols = schema.select_dtypes(include="number").columns.tolist()
+    cat_cols = schema.select_dtypes(exclude="number").columns.tolist()
+
+    #User multiselects to choose which numeric and categorical columns to show as filters
+    selected_numeric = st.sidebar.multiselect("Numeric Filters", options=numeric_cols, default=[])
+    selected_categorical = st.sidebar.multiselect("Categorical Filters", options=cat_cols, default=[])
+
+    #Load the saved chart files, compiling only files that are new or changed since the last rerun
+    os.makedirs(CHART_DIR, exist_ok=True)
+    with rerun_timer.stage("chart load"):
+        compiled_charts = load_charts(CHART_DIR)
+
+    #Only load the columns used by the selected filters or read by a chart, or every column if any chart runs its own
+    #code on the data
+    read_fields = chart_fields(compiled_charts)
+    used_cols = list(schema.columns) if read_fields is None else [
+        col for col in schema.columns
+        if col in selected_numeric or col in selected_categorical or col in read_fields
+    ]
+    #Never project down to no columns at all, which would leave a frame without any rows
+    if not used_cols:
+        used_cols = list(schema.columns)
+
+    #Load the used columns through the shared memory-mapped cache, only re-reading the file when it changes
+    with rerun_timer.stage("dataset load"):
+        df_full = load_dataset(columns=used_cols)
+
+    #Collect the value chosen in each filter widget so all filters can be applied in one pass
+    numeric_ranges = {}
+    categorical_options = {}
+
+    #Create sliders for selected numeric columns
+    for col in selected_numeric:
+        #Look up minimum and maximum values for the current numeric column from the cached column statistics
+        stats = column_stats(col)
+        min_val, max_val = float(stats["min"]), float(stats["max"])
+        #Add a slider to the sidebar for selecting a numeric value range
+        sel_range = st.sidebar.slider(
+            #Label for the slider
+            f"{col} Range",    
+            #Minimum possible value          
+            min_value=min_val,   
+            #Maximum possible value        
+            max_value=max_val,   
+            #Default slider range (full span)        
+            value=(min_val, max_val),  
+            #Unique key for this filter to track state  
+            key=f"filter_{col}"          
+        )
+        #Record the selected slider range values for this column
+        numeric_ranges[col] = sel_range
+
+    #Create multiselects for selected categorical columns
+    for col in selected_categorical:
+        #Retrieve sorted list of unique non-null options for the current categorical column from the cached column statistics
+        options = list(column_stats(col)["value_counts"])
+        #Add a multiselect widget to the sidebar for selecting categories
+        sel_opts = st.sidebar.multiselect(
+            #Label for the multiselect
+            f"{col} Options", 
+            #Available selection options     
+            options=options, 
+            #Default selection (select all by default)      
+            default=options,       
+            #Unique key for this filter to track state
+            key=f"filter_{col}"    
+        )
+        #Record the selected categories for this column
+        categorical_options[col] = sel_opts
+
+    #Filter the dataset once using the shared precomputed indexes, reusing results for filters that haven't changed
+    with rerun_timer.stage("filters"):
+        row_mask = get_filter_engine().selection(df_full, numeric_ranges, categorical_options)
+        #Skip building a new frame when nothing is filtered out
+        if row_mask is not None and row_mask.all():
+            row_mask = None
+        df = df_full if row_mask is None else df_full.iloc[row_mask]
+
+    #Log applied filters
+    event_log.log("filters", f"Filters applied - Numeric: {selected_numeric}, Categorical: {selected_categorical}",
+                  numeric=selected_numeric, categorical=selected_categorical)
+
+    #Check for existing saved dashboard layout
+    if not os.path.exists("dashboard_layout.py"):
+        st.error("No dashboard layout found from previous lesson. Please complete the previous lesson first.")
+        st.stop()
+
+    #Read in AI-generated layout code from file
+    with open("dashboard_layout.py", "r", encoding="utf-8") as f:
+        dashboard_layout_code = f.read()
+
+    #Identify the current filter combination, so charts already built for it can be reused
+    chart_state_key = filter_state_key(dataset_version(), used_cols, numeric_ranges, categorical_options)
+
+    #Build all compiled charts concurrently against the current filtered dataset, so one slow chart doesn't hold up the rest
+    with rerun_timer.stage("charts"):
+        charts, chart_errors, chart_timings = build_charts(
+            compiled_charts, df, max_workers=MAX_CHART_WORKERS, timeout=CHART_TIMEOUT_S,
+            cache=get_chart_cache(), state_key=chart_state_key
+        )
+
+    #Time each chart that was built on its own, against the version of its code, so a changed chart starts new timings
+    for chart_key, timing in chart_timings.items():
+        if not timing["cached"]:
+            rerun_timer.record(f"chart: {chart_key}", timing["execute_ms"], compiled_charts[chart_key].digest)
+
+    #Find the charts compiled during this rerun because their files are new or changed; the rest reused their compiled code
+    recompiled = {
+        chart_key: chart.compile_ms for chart_key, chart in compiled_charts.items() if chart.compiled_at >= rerun_timer.started
+    }
+
+    #Display an error message for any chart file that failed to load
+    for fname, e in chart_errors.items():
+        st.error(f"Failed to load {fname}: {e}")
+
+    #Log how long each chart took to execute (and to compile, if it was compiled in this rerun), or that it came from the chart cache
+    event_log.log("charts", "Chart timings - " + ", ".join(
+        f"{chart_key}: cached" if timing["cached"] else
+        (f"{chart_key}: compile {recompiled[chart_key]:.1f} ms, " if chart_key in recompiled else f"{chart_key}: ")
+        + f"execute {timing['execute_ms']:.1f} ms"
+        for chart_key, timing in chart_timings.items()
+    ), timings=chart_timings, compiled=recompiled)
+
+    #Warn if no charts found
+    if not charts:
+        #Display Streamlit warning message if no charts are loaded into the dashboard
+        st.warning("No saved charts found. Please generate charts first.")
+        #Log this warning event to the log file
+        event_log.log("charts", "No saved charts found when dashboard ran.", level=logging.WARNING)
+        #Stop the app execution since there’s nothing to display
+        st.stop()
+
+    #Display charts in the arrangement specified by saved dashboard layout code
+    try:
+        #Execute the AI-generated dashboard layout code, injecting charts and Streamlit into its local namespace
+        with rerun_timer.stage("layout"):
+            exec(dashboard_layout_code, {}, charts | {"st": st})
+        #Log a success message if the dashboard layout executes without errors
+        event_log.log("layout", "Dashboard layout successfully executed.")
+    except Exception as e:
+        #Display error message in the Streamlit UI if the layout execution fails
+        st.error(f"Error running dashboard layout: {e}")
+        #Log the error message to the log file, with the full traceback for debugging purposes
+        event_log.log("layout", f"Error executing dashboard layout: {e}", level=logging.ERROR, traceback=traceback.format_exc())
+
+    #Add AI Chabot section in sidebar
+    st.sidebar.header("AI Assistant")
+    #Determine if chat history exists in the session state and initialize if it doesn't
+    if "chat_history" not in st.session_state:
+        st.session_state.chat_history = []
+    #Keep a token-budgeted window over the chat history, summarizing older turns instead of resending them
+    if "chat_context" not in st.session_state:
+        st.session_state.chat_context = ChatContext()
+
+    #Create text input field in sidebar to allow users to type in message
+    user_input = st.sidebar.text_input(
+        "Ask a question about this hotel dashboard:",
+        key="ui_input"
+    )
 
-        try:
-            #Send chat history to OpenAI LLM and receive response
-            resp = client.chat.completions.create(
-                #Select model
-                model="gpt-3.5-turbo",
-                messages=messages
+    #Messages to send to the AI Assistant once the page has rendered, if a question was just asked
+    pending_messages = None
+
+    #Check if send button is clicked
+    if st.sidebar.button("Send", key="ui_send"):
+        if not user_input.strip():
+            #Provide warning if user has not entered any input
+            st.sidebar.warning("Please enter a question before sending.")
+        else:
+            #Add user's message to chat history
+            st.session_state.chat_history.append({"role": "user", "content": user_input})
+
+            #Build system prompt
+            system_prompt = (
+                "You are an assistant helping analyze a hotel performance dashboard. "
+                "You have access to a filtered Pandas DataFrame called `df`. "
+                "Before filtering, it has the following columns:\n\n"
+                f"{summarize_columns(column_catalog())}\n\n"
+                "If the user's question asks for a numeric/statistical answer (e.g. totals, averages, counts), "
+                "respond with a single valid Python expression using only built-in functions and pandas. "
+                "Do NOT explain or add markdown. Return just the expression that would compute the answer.\n"
+                "If the user asks about the structure of the data (e.g. column names, missing values, filters), "
+                "return an appropriate code snippet to inspect the DataFrame structure (e.g. `df.columns`, `df.info()`, etc.)."
             )
-            #Gather assistant's response
-            reply = resp.choices[0].message.content
-            #Add AI assistant's reply to chat history
+            #Add the recent chat history that fits the token budget, holding the request until the rest of the page has rendered
+            pending_messages = st.session_state.chat_context.messages(system_prompt, st.session_state.chat_history)
+
+    #Keep a sidebar container for the conversation, so the streamed reply can be written into it at the end of the run
+    chat_box = st.sidebar.container()
+
+    #Loop through the chat history stored in session state and display each message
+    for msg in st.session_state.chat_history:
+        if msg["role"] == "user":
+            chat_box.markdown(f"**You:** {msg['content']}")
+        else:
+            chat_box.markdown(f"**Bot:** {msg['content']}")
+
+    #Add feedback section in the sidebar for user input
+    st.sidebar.header("📣 Feedback")
+
+    #Create thumbs-up feedback button
+    if st.sidebar.button("👍 Dashboard looks great"):
+        #Log positive feedback when user clicks thumbs-up
+        event_log.log("feedback", "User feedback: 👍 Dashboard looks great", rating="up")
+        #Display thank you message in sidebar
+        st.sidebar.success("Thank you for the positive feedback!")
+
+    #Create thumbs-down feedback button
+    if st.sidebar.button("👎 Needs improvement"):
+        #Log negative feedback when user clicks thumbs-down
+        event_log.log("feedback", "User feedback: 👎 Needs improvement", rating="down")
+        #Display thank you message for constructive feedback
+        st.sidebar.info("Thanks, we’ll review your feedback.")
+
+    #Add text input for written feedback
+    feedback = st.sidebar.text_area("Additional Comments")
+
+    #Save written feedback when submitted
+    if st.sidebar.button("Submit Feedback"):
+        #If text area is empty, prompt the user to enter feedback
+        if not feedback.strip():
+            st.sidebar.warning("Please enter your feedback before submitting.")
+        else:
+            #Log user’s written feedback to log file
+            event_log.log("feedback", f"User written feedback: {feedback}", comment=feedback)
+            #Confirm feedback submission to user
+            st.sidebar.success("Thank you, your feedback has been logged.")
+
+    #Read and display recent log entries for dashboard activity and feedback
+    with st.expander("Recent Log Entries"):
+
+        #Choose which type of event to show
+        log_type = st.selectbox("Event type", ["all"] + list(EVENT_TYPES), key="log_event_type")
+        #Read only the last 10 events, seeking back from the end of the event files instead of reading them whole
+        with rerun_timer.stage("log tail"):
+            events = event_log.tail(10, event_type=None if log_type == "all" else log_type)
+        if events:
+            #Display last 10 events in a Streamlit code block
+            st.code(format_events(events))
+        else:
+            #If log file doesn't exist yet, notify user
+            st.write("No log entries found yet.")
+        #Show how many events are still waiting to be written and how many were dropped because the queue was full
+        st.caption(f"{event_log.queued} events waiting to be written, {event_log.dropped} dropped")
+
+    #Answer a newly asked question last, so the dashboard is already on screen while the reply streams in
+    if pending_messages is not None:
+        #Reuse the expression generated earlier for the same question on a dataset with the same columns
+        expression_cache = get_expression_cache()
+        dataset_fingerprint = schema_fingerprint()
+        cached_reply = expression_cache.get(user_input, dataset_fingerprint)
+        #Show the reply as it streams in, token by token
+        reply_line = chat_box.empty()
+        reply = ""
+        stream_stats = {}
+        try:
+            if cached_reply is not None:
+                reply = cached_reply
+                #Log the cache hit along with the cache's running totals
+                event_log.log("assistant", f"Assistant reply - cached expression (hits {expression_cache.hits}, misses {expression_cache.misses})")
+            else:
+                #Send chat history to OpenAI LLM and stream back the response
+                with rerun_timer.stage("assistant llm"):
+                    for token in stream_completion(client, pending_messages, stats=stream_stats):
+                        reply += token
+                        reply_line.markdown(f"**Bot:** {reply}▌")
+                #Log the prompt size, how long the first token and the full reply took, and how busy the request queue is
+                scheduler_metrics = client.metrics()
+                event_log.log(
+                    "assistant",
+                    f"Assistant reply - prompt ~{count_message_tokens(pending_messages)} tokens, "
+                    f"first token {stream_stats.get('first_token_ms', 0):.0f} ms, total {stream_stats['total_ms']:.0f} ms, "
+                    f"queue depth {scheduler_metrics['queued']}, avg wait {scheduler_metrics['avg_wait_ms']:.0f} ms, "
+                    f"rate limited {scheduler_metrics['rate_limited']}"
+                )
             try:
-                #Try to evaluate reply if it's a simple expression (not structural code)
-                result = eval(reply, {"df": df, "pd": pd})
-                st.session_state.chat_history.append({
-                    "role": "assistant",
-                    "content": str(result)
-                })
+                #Reuse the result if this expression was already evaluated under the same dataset version and filters
+                result_cache = get_result_cache()
+                result_key = expression_hash(reply)
+                result_state_key = filter_state_key(dataset_version(), schema.columns, numeric_ranges, categorical_options)
+                content = result_cache.get(result_key, result_state_key)
+                if content is None:
+                    #Try to evaluate reply if it's a simple expression (not structural code), on all columns of the filtered rows,
+                    #selecting them with the filters' row mask only when something is filtered out
+                    with rerun_timer.stage("assistant eval"):
+                        eval_df = load_dataset() if row_mask is None else load_dataset().iloc[row_mask]
+                        content = str(eval(reply, {"df": eval_df, "pd": pd}))
+                    result_cache.put(result_key, result_state_key, content)
+                #Remember expressions that evaluated, so the same question can skip the LLM next time
+                if cached_reply is None:
+                    expression_cache.put(user_input, dataset_fingerprint, reply)
             except Exception:
                 #If eval fails, show the original reply as code (e.g. structural queries)
-                st.session_state.chat_history.append({
-                    "role": "assistant",
-                    "content": f"```python\n{reply}\n```"
-                })
-
+                content = f"```python\n{reply}\n```"
         except Exception as e:
-            #Handle API errors and add to chat history
-            st.session_state.chat_history.append({
-                "role": "assistant",
-                "content": f"Error: {e}"
-            })
-
-#Loop through the chat history stored in session state and display each message
-for msg in st.session_state.chat_history:
-    if msg["role"] == "user":
-        st.sidebar.markdown(f"**You:** {msg['content']}")
-    else:
-        st.sidebar.markdown(f"**Bot:** {msg['content']}")
-        
-#Add feedback section in the sidebar for user input
-st.sidebar.header("📣 Feedback")
-
-#Create thumbs-up feedback button
-if st.sidebar.button("👍 Dashboard looks great"):
-    #Log positive feedback when user clicks thumbs-up
-    logging.info("User feedback: 👍 Dashboard looks great")
-    #Display thank you message in sidebar
-    st.sidebar.success("Thank you for the positive feedback!")
-
-#Create thumbs-down feedback button
-if st.sidebar.button("👎 Needs improvement"):
-    #Log negative feedback when user clicks thumbs-down
-    logging.info("User feedback: 👎 Needs improvement")
-    #Display thank you message for constructive feedback
-    st.sidebar.info("Thanks, we’ll review your feedback.")
-
-#Add text input for written feedback
-feedback = st.sidebar.text_area("Additional Comments")
-
-#Save written feedback when submitted
-if st.sidebar.button("Submit Feedback"):
-    #If text area is empty, prompt the user to enter feedback
-    if not feedback.strip():
-        st.sidebar.warning("Please enter your feedback before submitting.")
-    else:
-        #Log user’s written feedback to log file
-        logging.info(f"User written feedback: {feedback}")
-        #Confirm feedback submission to user
-        st.sidebar.success("Thank you, your feedback has been logged.")
-
-#Read and display recent log entries for dashboard activity and feedback
-with st.expander("Recent Log Entries"):
-
-    #Read last 10 lines of the dashboard maintenance log
-    if os.path.exists("dashboard_maintenance.log"):
-        #Open the log file and read its contents
-        with open("dashboard_maintenance.log") as f:
-            #Read only the last 10 lines for recent activity
-            lines = f.readlines()[-10:]
-        #Display last 10 log lines in a Streamlit code block
-        st.code("".join(lines))
-    else:
-        #If log file doesn't exist yet, notify user
-        st.write("No log entries found yet.")
\ No newline at end of file
+            #Handle API errors
+            content = f"Error: {e}"
+        #Add AI assistant's reply to chat history and replace the streamed text with it
+        st.session_state.chat_history.append({"role": "assistant", "content": content})
+        reply_line.markdown(f"**Bot:** {content}")
+finally:
+    #Add this rerun's stage timings to the shared rolling timings, exporting them to the metrics file now and then
+    rerun_timings = rerun_timer.finish()
+
+#Show the timing panel to admins, who open the dashboard with ?admin=<token>
+if is_admin():
+    render_timing_panel(get_rerun_profiler(), rerun_timings)
+
@@ -0,0 +1,253 @@
+#Build with AI: AI-Powered Dashboards with Streamlit
+#Benchmark the Dashboard Pipeline on Synthetic Hotel Datasets
+
+#Run from the Chapter_4 folder with:  python -m pytest -q bench_dashboard.py
+#BENCH_SIZES picks the dataset sizes (default "10K,1M,10M"). Baselines are machine-specific, so a benchmark without one
+#fails: record them on the machine that runs the gate with BENCH_UPDATE_BASELINES=1, which also replaces stored baselines
+
+#Import packages
+import streamlit as st
+import altair as alt
+import pandas as pd
+import numpy as np
+import pyarrow as pa
+import json, logging, os, statistics, time
+import pytest
+from data_store import atomic_path, load_dataset
+from filter_engine import FilterEngine
+from chart_registry import CHART_DIR, build_charts, load_charts
+
+#Keep Streamlit's warnings about running without a server out of the benchmark output
+logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+#Render charts the way the dashboard does, with VegaFusion pre-transforming their data
+alt.data_transformers.enable("vegafusion")
+
+#Dataset sizes to benchmark, and how many timed rounds each size gets
+BENCHMARK_SIZES = {"10K": 10_000, "1M": 1_000_000, "10M": 10_000_000}
+BENCHMARK_ROUNDS = {"10K": 5, "1M": 3, "10M": 1}
+
+#Folder for the generated datasets, which are reused by later runs with the same size and seed
+BENCH_DATA_DIR = "bench_data"
+BENCH_SEED = 0
+
+#Stored baseline median per size and benchmark, and the results of the latest run
+BASELINE_PATH = "benchmark_baselines.json"
+RESULTS_PATH = "benchmark_results.json"
+
+#A benchmark fails when its median is this many times its baseline and at least this many ms slower
+REGRESSION_TOLERANCE = 1.5
+MIN_REGRESSION_MS = 5
+
+#Columns describing where a hotel is, copied together from one real hotel
+LOCATION_COLUMNS = ["City", "State or Provence", "Country", "Latitude", "Longitude"]
+
+#Typical expressions returned by the AI assistant
+ASSISTANT_EXPRESSIONS = [
+    "df['Profit'].sum()",
+    "df.groupby('Country')['Revenue'].mean()",
+    "df[df['Year'] == df['Year'].max()]['Profit'].idxmax()",
+    "df.groupby(['Country', 'Year'])[['Revenue', 'Profit']].sum().sort_values('Profit').tail(5)",
+    "df['Utilities'].describe()",
+]
+
+#Sizes chosen for this run
+SELECTED_SIZES = [size.strip() for size in os.getenv("BENCH_SIZES", ",".join(BENCHMARK_SIZES)).split(",") if size.strip()]
+
+#Medians measured in this run, by size and benchmark
+_results = {}
+
+
+#Rows generated and written at a time, so even the largest dataset is never held in memory whole
+GENERATE_CHUNK_ROWS = 1_000_000
+
+
+#Generate a dataset with the cleaned dataset's columns and types: each hotel gets one row per year, a real hotel's
+#location, and revenue and expenses in the same proportions as the bundled data
+def make_hotel_dataset(rows, seed=BENCH_SEED, first_row=0):
+    """Return a synthetic Landon hotel DataFrame with `rows` rows, starting at row `first_row` of the full dataset."""
+    source = load_dataset()
+    rng = np.random.default_rng([seed, first_row])
+    years = np.sort(source["Year"].unique())
+    row = np.arange(first_row, first_row + rows)
+    first_hotel = first_row // len(years)
+    hotel = row // len(years) - first_hotel
+    hotels = hotel[-1] + 1 if rows else 0
+    locations = source[LOCATION_COLUMNS].drop_duplicates().reset_index(drop=True)
+    location = rng.integers(0, len(locations), hotels)[hotel]
+    revenue = rng.choice(source["Revenue"].to_numpy(), hotels)[hotel] * rng.lognormal(0, 0.1, rows)
+    expense_cols = [col for col in source.select_dtypes("number").columns if col not in ("Year", "Profit", "Revenue", "Latitude", "Longitude")]
+    data = {
+        "Hotel ID": np.array([f"LH-{first_hotel + i}" for i in range(hotels)], dtype=object)[hotel],
+        "Year": years[row % len(years)],
+        "Revenue": revenue,
+    }
+    for col in expense_cols:
+        ratio = (source[col] / source["Revenue"]).mean()
+        data[col] = revenue * ratio * rng.lognormal(0, 0.05, rows)
+    data["Profit"] = revenue - sum(data[col] for col in expense_cols)
+    for col in LOCATION_COLUMNS:
+        data[col] = locations[col].to_numpy()[location]
+    df = pd.DataFrame(data, index=row)[list(source.columns)]
+    return df.astype({col: dtype for col, dtype in source.dtypes.items() if pd.api.types.is_numeric_dtype(dtype)})
+
+
+#Create a dataset file once per size and seed, writing it chunk by chunk and renaming it into place when complete
+def dataset_path(size):
+    """Return the path of the synthetic dataset for `size` (a key of BENCHMARK_SIZES), generating it on first use."""
+    path = os.path.join(BENCH_DATA_DIR, f"landon_{size}_seed{BENCH_SEED}.arrow")
+    if os.path.exists(path):
+        return path
+    os.makedirs(BENCH_DATA_DIR, exist_ok=True)
+    rows = BENCHMARK_SIZES[size]
+    writer = None
+    with atomic_path(path) as tmp_path, pa.OSFile(tmp_path, "wb") as sink:
+        for first_row in range(0, rows, GENERATE_CHUNK_ROWS):
+            table = pa.Table.from_pandas(make_hotel_dataset(min(GENERATE_CHUNK_ROWS, rows - first_row), first_row=first_row), preserve_index=False)
+            if writer is None:
+                writer = pa.ipc.new_file(sink, table.schema)
+            writer.write_table(table)
+        writer.close()
+    return path
+
+
+#Read stored baselines, by size and benchmark
+def load_baselines(path=BASELINE_PATH):
+    """Return the baselines stored at `path`, or an empty dict before the first run."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+#Check whether this run records baselines instead of comparing with them
+def updating_baselines():
+    """Return True when BENCH_UPDATE_BASELINES=1 asks the run to record its measurements as the new baselines."""
+    return os.getenv("BENCH_UPDATE_BASELINES") == "1"
+
+
+#Write a run's results, and record them as baselines when asked to
+def store_results(results, results_path=RESULTS_PATH, baseline_path=BASELINE_PATH, baseline_of=lambda result: result["median_ms"]):
+    """Save `results` as JSON and, when updating baselines, merge `baseline_of(result)` for each measurement into the baselines file."""
+    with open(results_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=1)
+    if not updating_baselines():
+        return
+    baselines = load_baselines(baseline_path)
+    for size, size_results in results.items():
+        for name, result in size_results.items():
+            baselines.setdefault(size, {})[name] = baseline_of(result)
+    with atomic_path(baseline_path) as tmp_path, open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(baselines, f, indent=1, sort_keys=True)
+
+
+#Time `func` over the size's rounds, record the median, and fail if it has no baseline or regressed past it
+def benchmark(size, name, func):
+    """Run `func` BENCHMARK_ROUNDS[size] times and return its last result; the median time is checked and stored."""
+    times = []
+    for _ in range(BENCHMARK_ROUNDS[size]):
+        started = time.perf_counter()
+        result = func()
+        times.append((time.perf_counter() - started) * 1000)
+    median = statistics.median(times)
+    _results.setdefault(size, {})[name] = {"median_ms": median, "min_ms": min(times), "rounds": len(times)}
+    if updating_baselines():
+        return result
+    baseline = load_baselines().get(size, {}).get(name)
+    assert baseline is not None, f"{name} at {size} rows has no baseline, record one with BENCH_UPDATE_BASELINES=1"
+    assert median <= max(baseline * REGRESSION_TOLERANCE, baseline + MIN_REGRESSION_MS), (
+            f"{name} at {size} rows took {median:.1f} ms, baseline {baseline:.1f} ms"
+        )
+    return result
+
+
+#Store this run's results and baselines once every benchmark has run
+@pytest.fixture(scope="module", autouse=True)
+def _store_results():
+    yield
+    store_results(_results)
+
+
+#Generate (or reuse) the dataset for each selected size
+@pytest.fixture(scope="module", params=SELECTED_SIZES)
+def dataset(request):
+    return request.param, dataset_path(request.param)
+
+
+#Filters like a typical dashboard session: the middle half of Profit in two countries
+def _typical_filters(df):
+    low, high = df["Profit"].quantile(0.25), df["Profit"].quantile(0.75)
+    return {"Profit": (low, high)}, {"Country": sorted(df["Country"].dropna().unique().tolist())[:2]}
+
+
+#Benchmark loading the dataset from disk with empty caches, then from the shared cache
+def test_bench_dataset_load(dataset):
+    """Time a cold load of the whole dataset and a warm load served from the cache."""
+    size, path = dataset
+
+    #Clear the cached tables and columns before each cold load
+    def cold_load():
+        st.cache_resource.clear()
+        return load_dataset(path)
+
+    assert len(benchmark(size, "dataset load (cold)", cold_load)) == BENCHMARK_SIZES[size]
+    benchmark(size, "dataset load (warm)", lambda: load_dataset(path))
+
+
+#Benchmark applying the sidebar filters, building the indexes from scratch and then reusing them
+def test_bench_filters(dataset):
+    """Time the filter engine on fresh indexes and on an engine that already indexed the columns."""
+    size, path = dataset
+    df = load_dataset(path)
+    numeric_ranges, categorical_options = _typical_filters(df)
+    filtered = benchmark(size, "filters (cold)", lambda: FilterEngine().apply(df, numeric_ranges, categorical_options))
+    assert 0 < len(filtered) < len(df)
+
+    #Move the range each round so the cached predicate bitmaps aren't reused, only the column indexes
+    engine = FilterEngine()
+    engine.apply(df, numeric_ranges, categorical_options)
+    lows = iter(df["Profit"].quantile(np.linspace(0.1, 0.4, BENCHMARK_ROUNDS[size])).tolist())
+    high = numeric_ranges["Profit"][1]
+    benchmark(size, "filters (indexed)", lambda: engine.apply(df, {"Profit": (next(lows), high)}, categorical_options))
+
+
+#Benchmark building each saved chart against the filtered dataset and drawing it, which is where VegaFusion
+#transforms the chart's data; binding a chart's template alone takes well under a millisecond
+@pytest.mark.parametrize("chart_name", sorted(load_charts(CHART_DIR)))
+def test_bench_chart(dataset, chart_name):
+    """Time building and rendering one chart file's chart, without the chart cache."""
+    size, path = dataset
+    df = load_dataset(path)
+    df = FilterEngine().apply(df, *_typical_filters(df))
+    compiled = {chart_name: load_charts(CHART_DIR)[chart_name]}
+
+    def build_and_render():
+        charts, errors, _ = build_charts(compiled, df)
+        assert not errors and chart_name in charts
+        st.altair_chart(charts[chart_name])
+
+    benchmark(size, f"chart: {chart_name}", build_and_render)
+
+
+#Benchmark executing the saved dashboard layout, which hands every chart to Streamlit
+def test_bench_layout(dataset):
+    """Time the layout code placing all charts, including Streamlit serializing their data."""
+    size, path = dataset
+    if not os.path.exists("dashboard_layout.py"):
+        pytest.skip("no saved dashboard layout")
+    with open("dashboard_layout.py", encoding="utf-8") as f:
+        layout_code = f.read()
+    df = load_dataset(path)
+    charts, errors, _ = build_charts(load_charts(CHART_DIR), FilterEngine().apply(df, *_typical_filters(df)))
+    assert not errors
+    benchmark(size, "layout", lambda: exec(layout_code, {}, charts | {"st": st}))
+
+
+#Benchmark evaluating the kind of expressions the AI assistant returns
+def test_bench_assistant_eval(dataset):
+    """Time evaluating each typical assistant expression on the filtered dataset."""
+    size, path = dataset
+    df = load_dataset(path)
+    df = FilterEngine().apply(df, *_typical_filters(df))
+    for expression in ASSISTANT_EXPRESSIONS:
+        benchmark(size, f"assistant eval: {expression}", lambda: str(eval(expression, {"df": df, "pd": pd})))
@@ -0,0 +1,256 @@
+#Build with AI: AI-Powered Dashboards with Streamlit
+#Drive Full Dashboard Reruns Headlessly and Measure Each Interaction
+
+#Run from the Chapter_4 folder with:  python -m pytest -q bench_reruns.py
+#RERUN_SIZES picks the datasets (default "bundled,1M"): "bundled" is the cleaned dataset, the others are the synthetic
+#sizes from bench_dashboard.py. An interaction without a baseline fails; BENCH_UPDATE_BASELINES=1 records or replaces them
+
+#Import packages
+import streamlit as st
+import pandas as pd
+import pyarrow as pa
+import json, logging, os, sys, threading, time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from streamlit.testing.v1 import AppTest
+from data_store import dataset_version, link_dataset, load_dataset
+from expression_cache import get_expression_cache
+from bench_dashboard import MIN_REGRESSION_MS, REGRESSION_TOLERANCE, dataset_path, load_baselines, store_results, updating_baselines
+
+#Keep Streamlit's warnings about running without a server out of the harness output
+logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+#Dashboard script driven by the harness, and the longest a single interaction may take
+DASHBOARD_SCRIPT = os.path.abspath("Landon_Hotel_Dashboard.py")
+RERUN_TIMEOUT_S = 300
+
+#Stored baseline per dataset and interaction, and the results of the latest run
+RERUN_BASELINE_PATH = "rerun_baselines.json"
+RERUN_RESULTS_PATH = "rerun_results.json"
+
+#Peak memory may grow by this factor and at least this many MB before an interaction fails; resident memory is
+#noisier than timings, since freed pages aren't always handed back at once
+MEMORY_TOLERANCE = 1.5
+MIN_MEMORY_REGRESSION_MB = 20
+
+#Seconds between resident memory samples while an interaction runs
+MEMORY_SAMPLE_S = 0.005
+
+#Files the dashboard reads from its working folder, linked into the harness's own folder
+DASHBOARD_FILES = ("charts", "dashboard_layout.py")
+
+#Question sent to the assistant, and the expression the mocked LLM streams back for it
+ASSISTANT_QUESTION = "What is the total profit?"
+MOCK_REPLY_TOKENS = ["df", "['Profit']", ".sum()"]
+
+#Datasets chosen for this run
+SELECTED_SIZES = [size.strip() for size in os.getenv("RERUN_SIZES", "bundled,1M").split(",") if size.strip()]
+
+#Measurements from this run, by dataset and interaction
+_results = {}
+
+
+#Stand-in for the OpenAI API that streams the same expression back for every chat completion
+class _MockCompletionHandler(BaseHTTPRequestHandler):
+    requests = 0
+
+    def do_POST(self):
+        type(self).requests += 1
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for token in [""] + MOCK_REPLY_TOKENS:
+            chunk = {"id": "c1", "object": "chat.completion.chunk", "created": 0, "model": body["model"],
+                     "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def log_message(self, *args):
+        pass
+
+
+#Count DataFrame deep copies and newly constructed frames, from any thread, while the block runs
+@contextmanager
+def count_frames():
+    """Yield a dict whose 'df_copies' and 'df_built' counts grow with every deep copy and DataFrame construction."""
+    counts = {"df_copies": 0, "df_built": 0}
+    copy, init = pd.DataFrame.copy, pd.DataFrame.__init__
+
+    def counted_copy(self, deep=True):
+        if deep:
+            counts["df_copies"] += 1
+        return copy(self, deep=deep)
+
+    def counted_init(self, *args, **kwargs):
+        counts["df_built"] += 1
+        init(self, *args, **kwargs)
+
+    pd.DataFrame.copy, pd.DataFrame.__init__ = counted_copy, counted_init
+    try:
+        yield counts
+    finally:
+        pd.DataFrame.copy, pd.DataFrame.__init__ = copy, init
+
+
+#Resident memory of this process in MB, which includes the memory-mapped and Arrow-allocated data that Python's own
+#allocation tracing can't see; without /proc, fall back to the peak so far from getrusage
+def _rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError, AttributeError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
+
+
+#Sample resident memory on a background thread while the block runs, and compare Arrow's allocations before and after
+@contextmanager
+def track_memory(interval_s=MEMORY_SAMPLE_S):
+    """Yield a dict that gets 'peak_rss_mb', the highest resident memory above the starting level, and 'arrow_mb',
+    the growth of Arrow's memory pool, once the block finishes."""
+    usage = {}
+    start_rss, start_arrow = _rss_mb(), pa.total_allocated_bytes()
+    peak = [start_rss]
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(interval_s):
+            peak[0] = max(peak[0], _rss_mb())
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    try:
+        yield usage
+    finally:
+        done.set()
+        sampler.join()
+        usage["peak_rss_mb"] = max(peak[0], _rss_mb()) - start_rss
+        usage["arrow_mb"] = (pa.total_allocated_bytes() - start_arrow) / 1e6
+
+
+#Send a question to the assistant through the sidebar
+def _ask(at, question):
+    at.sidebar.text_input(key="ui_input").set_value(question)
+    return at.sidebar.button(key="ui_send").click().run()
+
+
+#Ask a question already answered, confirming the reply came from the expression cache instead of the LLM
+def _ask_cached(at, question):
+    hits, requests = get_expression_cache().hits, _MockCompletionHandler.requests
+    _ask(at, question)
+    assert get_expression_cache().hits == hits + 1, "the repeated question missed the expression cache"
+    assert _MockCompletionHandler.requests == requests, "the repeated question was sent to the LLM"
+
+
+#The scripted interactions, in order: filters, sliders and chat messages as a user would click through them
+def interactions(df):
+    """Return (name, action) pairs; each action takes the AppTest and performs one interaction and its rerun."""
+    low, high = (float(q) for q in df["Profit"].quantile([0.25, 0.75]))
+    countries = sorted(df["Country"].dropna().unique().tolist())[:2]
+    return [
+        ("first load", lambda at: at.run()),
+        ("rerun unchanged", lambda at: at.run()),
+        ("add numeric filter", lambda at: at.sidebar.multiselect[0].set_value(["Profit"]).run()),
+        ("add categorical filter", lambda at: at.sidebar.multiselect[1].set_value(["Country"]).run()),
+        ("move slider", lambda at: at.sidebar.slider[0].set_range(low, high).run()),
+        ("pick categories", lambda at: at.sidebar.multiselect[2].set_value(countries).run()),
+        ("ask assistant", lambda at: _ask(at, ASSISTANT_QUESTION)),
+        ("ask again (cached)", lambda at: _ask_cached(at, ASSISTANT_QUESTION)),
+    ]
+
+
+#Play the interactions against a fresh app with empty caches, measuring each one's time, memory and DataFrame copies
+def run_scenario(steps):
+    """Return {interaction: measurements} for one pass over `steps`."""
+    st.cache_resource.clear()
+    st.cache_data.clear()
+    if os.path.exists("assistant_cache.sqlite"):
+        os.remove("assistant_cache.sqlite")
+    at = AppTest.from_file(DASHBOARD_SCRIPT, default_timeout=RERUN_TIMEOUT_S)
+    measurements = {}
+    for name, action in steps:
+        with track_memory() as usage, count_frames() as counts:
+            started = time.perf_counter()
+            action(at)
+            wall_ms = (time.perf_counter() - started) * 1000
+        measurements[name] = dict(counts, **usage, wall_ms=wall_ms)
+        assert not at.exception, f"{name}: {at.exception[0].value}"
+        assert not at.error, f"{name}: {at.error[0].value}"
+    #Confirm the mocked reply was evaluated on the data rather than reported as an error
+    assert not at.session_state.chat_history[-1]["content"].startswith("Error")
+    return measurements
+
+
+#Compare one interaction with its baseline, returning a description of each regression
+def regressions(name, result, baseline):
+    """Return messages for a slower wall time, more resident or Arrow memory, or more DataFrame copies than the baseline."""
+    found = []
+    if result["wall_ms"] > max(baseline["wall_ms"] * REGRESSION_TOLERANCE, baseline["wall_ms"] + MIN_REGRESSION_MS):
+        found.append(f"{name}: {result['wall_ms']:.0f} ms, baseline {baseline['wall_ms']:.0f} ms")
+    #Baselines stored before a measurement existed are only checked on the measurements they have
+    for memory in ("peak_rss_mb", "arrow_mb"):
+        if memory in baseline and result[memory] > max(baseline[memory] * MEMORY_TOLERANCE, baseline[memory] + MIN_MEMORY_REGRESSION_MB):
+            found.append(f"{name}: {memory} {result[memory]:.1f}, baseline {baseline[memory]:.1f}")
+    for count in ("df_copies", "df_built"):
+        if result[count] > baseline[count]:
+            found.append(f"{name}: {result[count]} {count}, baseline {baseline[count]}")
+    return found
+
+
+#Serve mocked completions and point the OpenAI client at them for the whole module
+@pytest.fixture(scope="module")
+def mock_llm():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _MockCompletionHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    saved = {key: os.environ.get(key) for key in ("OPENAI_API_KEY", "OPENAI_BASE_URL")}
+    os.environ.update(OPENAI_API_KEY="sk-test", OPENAI_BASE_URL=f"http://127.0.0.1:{server.server_port}/v1")
+    yield
+    server.shutdown()
+    for key, value in saved.items():
+        if value is None:
+            os.environ.pop(key, None)
+        else:
+            os.environ[key] = value
+
+
+#Run the dashboard from its own folder, with the dataset linked in rather than copied
+@pytest.fixture(params=SELECTED_SIZES)
+def dashboard_dir(request, tmp_path):
+    size = request.param
+    dataset = dataset_version()[0] if size == "bundled" else os.path.abspath(dataset_path(size))
+    for name in DASHBOARD_FILES:
+        os.symlink(os.path.abspath(name), tmp_path / name)
+    link_dataset(dataset, str(tmp_path / "cleaned_data_final.arrow"))
+    cwd = os.getcwd()
+    os.chdir(tmp_path)
+    yield size, dataset
+    os.chdir(cwd)
+
+
+#Store this run's results and baselines once every dataset has run
+@pytest.fixture(scope="module", autouse=True)
+def _store_results():
+    cwd = os.getcwd()
+    yield
+    store_results(_results, os.path.join(cwd, RERUN_RESULTS_PATH), os.path.join(cwd, RERUN_BASELINE_PATH), lambda result: result)
+
+
+#Drive the dashboard through the scripted interactions and check each one against its baseline
+def test_rerun_responsiveness(mock_llm, dashboard_dir):
+    """Time each interaction's rerun, measure its resident and Arrow memory and count DataFrame copies, failing on regressions."""
+    size, dataset = dashboard_dir
+    steps = interactions(load_dataset(dataset, columns=["Profit", "Country"]))
+    baselines = load_baselines(os.path.join(os.path.dirname(DASHBOARD_SCRIPT), RERUN_BASELINE_PATH)).get(size, {})
+
+    results = run_scenario(steps)
+    _results[size] = results
+
+    #Compare with the stored baselines unless they're being replaced
+    if not updating_baselines():
+        missing = [name for name in results if name not in baselines]
+        assert not missing, f"No baseline for {', '.join(missing)} on {size}, record them with BENCH_UPDATE_BASELINES=1"
+        found = [message for name, result in results.items() for message in regressions(name, result, baselines[name])]
+        assert not found, "Rerun regressions:\n" + "\n".join(found)
@@ -0,0 +1,94 @@
+#Build with AI: AI-Powered Dashboards with Streamlit
+#Pre-Aggregate Chart Data in pandas Before It Is Sent to the Browser
+
+#Import packages
+import altair as alt
+import pandas as pd
+from collections import namedtuple
+
+#Aggregates that give the same answer when re-applied to a single pre-aggregated row per group
+REAGGREGATABLE = {"sum", "min", "max", "mean", "median"}
+
+#Group-by keys, {column: aggregate} measures, and the folded columns a unit chart needs
+AggregationPlan = namedtuple("AggregationPlan", ["keys", "measures", "fold"])
+
+
+#Describe one encoding channel as a dict of field, aggregate, bin and timeUnit, or None if it can't be analyzed
+def _channel_def(channel):
+    if not isinstance(channel, alt.SchemaBase):
+        return None
+    kwds = {k: v for k, v in channel._kwds.items() if v is not alt.Undefined}
+    #Conditional encodings and sorts computed from other fields depend on the raw rows
+    if "condition" in kwds or isinstance(kwds.get("sort"), (alt.SchemaBase, dict)):
+        return None
+    definition = alt.utils.parse_shorthand(kwds["shorthand"]) if isinstance(kwds.get("shorthand"), str) else {}
+    for key in ("field", "aggregate", "bin", "timeUnit"):
+        if key in kwds:
+            definition[key] = kwds[key]
+    return definition
+
+
+#Work out how a unit chart's aggregation can be computed ahead of time, or None if it can't
+def plan_aggregation(chart):
+    """Return an AggregationPlan for a single-view chart whose encodings only use re-aggregatable aggregates."""
+    if not isinstance(chart, alt.Chart) or chart._get("params") is not alt.Undefined:
+        return None
+    #Only folds, and calculations whose output a later fold overwrites, can run after pre-aggregation
+    transforms = chart._get("transform", [])
+    fold = None
+    for i, transform in enumerate(transforms):
+        if isinstance(transform, alt.FoldTransform) and fold is None:
+            fold_as = transform._get("as", ["key", "value"])
+            fold = (list(transform.fold), fold_as[0], fold_as[1])
+        elif isinstance(transform, alt.CalculateTransform):
+            later_folds = [t for t in transforms[i + 1:] if isinstance(t, alt.FoldTransform)]
+            if not any(transform["as"] in t._get("as", ["key", "value"]) for t in later_folds):
+                return None
+        else:
+            return None
+    #Gather every encoded field, splitting them into group-by keys and aggregated measures
+    channels = []
+    for channel in chart._get("encoding", alt.FacetedEncoding())._kwds.values():
+        channels.extend(channel if isinstance(channel, list) else [channel])
+    keys, measures = [], {}
+    for channel in channels:
+        if channel is alt.Undefined:
+            continue
+        definition = _channel_def(channel)
+        if definition is None or definition.get("bin") or definition.get("timeUnit"):
+            return None
+        field, aggregate = definition.get("field"), definition.get("aggregate")
+        if aggregate is None and field is None:
+            continue
+        #Argmax and argmin aggregates are dicts naming another field, and need the raw rows
+        if not isinstance(field, str) or (aggregate is not None and (not isinstance(aggregate, str) or aggregate not in REAGGREGATABLE)):
+            return None
+        if aggregate is None:
+            if field not in keys:
+                keys.append(field)
+        elif measures.setdefault(field, aggregate) != aggregate:
+            return None
+    if not measures or any(key in measures for key in keys):
+        return None
+    #With a fold, the folded value is aggregated per source column and the fold key is created after grouping
+    if fold is not None:
+        fold_cols, fold_key, fold_value = fold
+        if fold_key in measures or fold_value in keys or any(col in keys or col in measures for col in fold_cols):
+            return None
+        if fold_value not in measures:
+            return None
+        keys = [key for key in keys if key != fold_key]
+        aggregate = measures.pop(fold_value)
+        measures.update({col: aggregate for col in fold_cols})
+    return AggregationPlan(keys, measures, fold)
+
+
+#Compute a plan's group-by in pandas, returning one row per group
+def apply_aggregation(plan, df):
+    """Return `df` aggregated according to `plan`, or `df` itself if it lacks a needed column."""
+    if any(col not in df.columns for col in list(plan.keys) + list(plan.measures)):
+        return df
+    if not plan.keys:
+        return pd.DataFrame({col: [df[col].agg(aggregate)] for col, aggregate in plan.measures.items()})
+    grouped = df.groupby(plan.keys, dropna=False, observed=True, sort=False)
+    return grouped.agg(plan.measures).reset_index()
@@ -0,0 +1,115 @@
+#Build with AI: AI-Powered Dashboards with Streamlit
+#Reuse Built Charts When a Filter Combination Comes Back
+
+#Import packages
+import streamlit as st
+import altair as alt
+import pandas as pd
+import hashlib, sys, threading
+from collections import OrderedDict
+
+#Total size of the chart data the cache may hold before the least recently used charts are dropped
+MAX_CHART_CACHE_BYTES = 256 * 1024 * 1024
+
+
+#Hash the inputs a built chart depends on besides its own code
+def filter_state_key(dataset_version, columns, numeric_ranges, categorical_options):
+    """Return a hash of the dataset version, loaded columns and active filter values, independent of widget order."""
+    state = (
+        tuple(dataset_version),
+        tuple(sorted(columns)),
+        tuple(sorted((col, float(low), float(high)) for col, (low, high) in numeric_ranges.items())),
+        tuple(sorted((col, tuple(sorted(map(repr, options)))) for col, options in categorical_options.items())),
+    )
+    return hashlib.sha256(repr(state).encode("utf-8")).hexdigest()
+
+
+#Collect the data frames of every view of a chart by id, so a frame shared by several views is only seen once
+def _chart_frames(chart, frames=None):
+    frames = {} if frames is None else frames
+    data = chart._get("data")
+    if isinstance(data, pd.DataFrame):
+        frames[id(data)] = data
+    for key in ("layer", "hconcat", "vconcat", "concat", "spec"):
+        sub = chart._get(key)
+        for view in sub if isinstance(sub, list) else [sub]:
+            if isinstance(view, alt.SchemaBase):
+                _chart_frames(view, frames)
+    return frames
+
+
+#Size a frame from its column buffers, without walking every Python object the way deep=True does
+def _frame_nbytes(frame):
+    return int(frame.memory_usage(index=True, deep=False).sum())
+
+
+#Built charts shared by every session, keyed by chart code and filter state. The Altair objects themselves are kept,
+#so VegaFusion still pre-transforms a cached chart's data when it is drawn; the cache saves building the chart
+class ChartCache:
+    """Least-recently-used store of built charts that evicts by the size of their data, counting shared frames once."""
+
+    def __init__(self, max_bytes=MAX_CHART_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        #Frames held by cached charts by id, with their size and the number of entries holding them
+        self._frames = {}
+        self._lock = threading.Lock()
+
+    def get(self, digest, state_key):
+        """Return the chart built from code `digest` under `state_key`, or None if it isn't cached."""
+        key = (digest, state_key)
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key][0]
+
+    def put(self, digest, state_key, chart):
+        """Store a built chart, evicting the least recently used charts until the cache fits its byte budget."""
+        key = (digest, state_key)
+        frames = _chart_frames(chart)
+        with self._lock:
+            #Only frames no other cached chart holds add to the cache's size
+            sizes = {frame_id: self._frames[frame_id][0] if frame_id in self._frames else _frame_nbytes(frame)
+                     for frame_id, frame in frames.items()}
+            nbytes = sys.getsizeof(chart) + sum(size for frame_id, size in sizes.items() if frame_id not in self._frames)
+            #Charts bigger than the whole budget are not worth keeping
+            if nbytes > self.max_bytes:
+                return
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (chart, sys.getsizeof(chart), list(frames))
+            self.nbytes += sys.getsizeof(chart)
+            for frame_id, size in sizes.items():
+                if frame_id in self._frames:
+                    self._frames[frame_id][1] += 1
+                else:
+                    self._frames[frame_id] = [size, 1]
+                    self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+
+    #Remove an entry, releasing the size of frames no other entry holds (called with the lock held)
+    def _drop(self, key):
+        _, nbytes, frame_ids = self._entries.pop(key)
+        self.nbytes -= nbytes
+        for frame_id in frame_ids:
+            self._frames[frame_id][1] -= 1
+            if self._frames[frame_id][1] == 0:
+                self.nbytes -= self._frames.pop(frame_id)[0]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+#Create one chart cache for the whole process
+@st.cache_resource(show_spinner=False)
+def get_chart_cache():
+    """Return the ChartCache shared by every dashboard session."""
+    return ChartCache()
@@ -0,0 +1,307 @@
+#Build with AI: AI-Powered Dashboards with Streamlit
+#Compile Saved Chart Files Once and Re-Run Them Against the Filtered Data
+
+#Import packages
+import streamlit as st
+import altair as alt
+import hashlib, os, re, time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from chart_aggregation import apply_aggregation, plan_aggregation
+
+#Folder holding the AI-generated chart files
+CHART_DIR = "charts"
+
+#Number of charts the dashboard builds at once, and how long any one chart may run
+MAX_CHART_WORKERS = min(8, os.cpu_count() or 1)
+CHART_TIMEOUT_S = 30
+
+#A chart file's source, its content hash and compiled code, plus its file version, how long compiling took and when
+#it finished (on the time.perf_counter clock)
+CompiledChart = namedtuple("CompiledChart", ["name", "fname", "version", "source", "digest", "code", "compile_ms", "compiled_at"])
+
+#A chart built once without data, the stand-in it was built on, the dataset fields it reads (None if unknown),
+#and the pre-aggregation plan of each view that can be aggregated ahead of time (keyed by the view's id)
+ChartTemplate = namedtuple("ChartTemplate", ["chart", "placeholder", "fields", "plans"])
+
+#Composite chart properties that hold sub-charts
+SUBCHART_KEYS = ("layer", "hconcat", "vconcat", "concat", "spec")
+
+#Matches the fields referenced in Vega expressions, e.g. datum["Supplies"] or datum.Year
+DATUM_FIELD = re.compile(r"""datum\[\s*["'](.+?)["']\s*\]|datum\.(\w+)""")
+
+
+#Read and compile one version of a chart file; the code object is kept for every session in the process
+@st.cache_resource(max_entries=256, show_spinner=False)
+def _compile_chart(path, inode, mtime_ns, size):
+    with open(path, encoding="utf-8") as f:
+        source = f.read()
+    start = time.perf_counter()
+    code = compile(source, path, "exec")
+    compiled_at = time.perf_counter()
+    compile_ms = (compiled_at - start) * 1000
+    fname = os.path.basename(path)
+    digest = hashlib.sha256(source.encode("utf-8")).hexdigest()
+    return CompiledChart(os.path.splitext(fname)[0], fname, (path, inode, mtime_ns, size), source, digest, code, compile_ms, compiled_at)
+
+
+#Load every chart file in the folder, sorted alphabetically
+def load_charts(chart_dir=CHART_DIR):
+    """Return {chart name: CompiledChart}, compiling only files that are new or changed since the last call."""
+    compiled = {}
+    for fname in sorted(os.listdir(chart_dir)):
+        #Check if the file is a Python file by confirming it ends with ".py"
+        if fname.lower().endswith(".py"):
+            path = os.path.abspath(os.path.join(chart_dir, fname))
+            stat = os.stat(path)
+            chart = _compile_chart(path, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            compiled[chart.name] = chart
+    return compiled
+
+
+#Stand-in for `df` while a chart template is built; chart code that reads any data from it fails
+class _TemplateData:
+    name = None
+
+    def __getattr__(self, name):
+        raise AttributeError(f"chart templates can't read df.{name}")
+
+    def __getitem__(self, key):
+        raise TypeError("chart templates can't index df")
+
+    def __len__(self):
+        raise TypeError("chart templates can't measure df")
+
+    def __iter__(self):
+        raise TypeError("chart templates can't iterate over df")
+
+
+#Yield (key, value) for every property in a chart's object tree
+def _walk(obj, key=None):
+    if isinstance(obj, alt.SchemaBase):
+        for k, v in obj._kwds.items():
+            if v is not alt.Undefined:
+                yield k, v
+                yield from _walk(v, k)
+    elif isinstance(obj, dict):
+        for k, v in obj.items():
+            yield k, v
+            yield from _walk(v, k)
+    elif isinstance(obj, list):
+        for v in obj:
+            yield key, v
+            yield from _walk(v, key)
+
+
+#Check that the placeholder is only ever used as a view's data, so binding new data fully replaces it
+def _is_template(chart, placeholder):
+    uses = [key for key, value in _walk(chart) if value is placeholder]
+    return bool(uses) and all(key == "data" for key in uses)
+
+
+#Collect every dataset field a chart reads, or None when a property can't be analyzed safely
+def _template_fields(chart):
+    fields = set()
+    for key, value in _walk(chart):
+        #Repeated, looked-up and tooltip-everything charts read fields that aren't spelled out
+        if key in ("repeat", "lookup", "from") or (key == "tooltip" and value is True):
+            return None
+        if key == "shorthand" and isinstance(value, str):
+            fields.add(alt.utils.parse_shorthand(value).get("field"))
+        elif key == "field" and isinstance(value, str):
+            fields.add(value)
+        elif key in ("fold", "groupby", "fields") and isinstance(value, str):
+            fields.add(value)
+        #Argmax and argmin aggregates name the field they compare by
+        elif key in ("argmax", "argmin") and isinstance(value, str):
+            fields.add(value)
+        elif key in ("calculate", "filter", "expr") and not isinstance(value, (dict, list)):
+            fields.update(a or b for a, b in DATUM_FIELD.findall(str(value)))
+    #Nested field paths like "a.b" or "a[0]" are not plain column names
+    if any(field and ("." in field or "[" in field) for field in fields):
+        return None
+    return fields
+
+
+#Run one version of a chart file against a placeholder so its chart can be reused with any data
+@st.cache_resource(max_entries=256, show_spinner=False)
+def _build_template(version, _compiled):
+    placeholder = _TemplateData()
+    local_vars = {"df": placeholder, "alt": alt}
+    try:
+        exec(_compiled.code, {}, local_vars)
+    #Charts whose code reads the data can't be templated and are re-run on every rerun instead
+    except Exception:
+        return None
+    chart = local_vars.get("chart")
+    if not isinstance(chart, alt.TopLevelMixin) or not _is_template(chart, placeholder):
+        return None
+    return ChartTemplate(chart, placeholder, _template_fields(chart), _plan_views(chart))
+
+
+#Plan pre-aggregation for every single view reachable through layers and concatenations
+def _plan_views(chart, plans=None):
+    plans = {} if plans is None else plans
+    plan = plan_aggregation(chart)
+    if plan is not None:
+        plans[id(chart)] = plan
+    #Views below a composite with its own transforms, or inside a facet or repeat, see rows the plan can't know about
+    if chart._get("transform") is alt.Undefined:
+        for key in ("layer", "hconcat", "vconcat", "concat"):
+            for sub in chart._get(key, []):
+                _plan_views(sub, plans)
+    return plans
+
+
+#Check whether every view inheriting data from this chart can be pre-aggregated
+def _fully_planned(chart, plans):
+    if id(chart) in plans:
+        return True
+    subs = [sub for key in ("layer", "hconcat", "vconcat", "concat") for sub in chart._get(key, [])]
+    inheriting = [sub for sub in subs if sub._get("data") is alt.Undefined]
+    return bool(subs) and chart._get("spec") is alt.Undefined and all(_fully_planned(sub, plans) for sub in inheriting)
+
+
+#Point every view of a template that used the placeholder at the given data, pre-aggregating it for planned views
+def _bind(chart, placeholder, data, plans, inherited=False):
+    bound = chart.copy(deep=False)
+    receives = inherited or chart._get("data") is placeholder
+    if chart._get("data") is placeholder:
+        #Leave the data off a composite whose views each get their own aggregated rows
+        bound.data = alt.Undefined if id(chart) not in plans and _fully_planned(chart, plans) else data
+    if receives and id(chart) in plans:
+        bound.data = apply_aggregation(plans[id(chart)], data)
+    #Sub-charts without data of their own inherit this chart's data
+    for key in SUBCHART_KEYS:
+        sub = chart._get(key)
+        if isinstance(sub, list):
+            bound[key] = [_bind(c, placeholder, data, plans, receives and c._get("data") is alt.Undefined) for c in sub]
+        elif isinstance(sub, alt.SchemaBase):
+            bound[key] = _bind(sub, placeholder, data, plans, receives and sub._get("data") is alt.Undefined)
+    return bound
+
+
+#Collect the dataset fields read by every chart, so the dashboard only has to load those columns
+def chart_fields(compiled):
+    """Return the set of fields the charts read, or None if any chart runs code on the data or reads unknown fields."""
+    fields = set()
+    for chart in compiled.values():
+        template = _build_template(chart.version, chart)
+        if template is None or template.fields is None:
+            return None
+        fields |= {field for field in template.fields if field}
+    return fields
+
+
+#Keep only the columns a chart reads, so each chart only serializes the data it needs
+def _project(df, fields):
+    if fields is None:
+        return df
+    columns = [col for col in df.columns if col in fields]
+    return df if len(columns) == len(df.columns) else df[columns]
+
+
+#Build one chart from its shared template, or by executing its code when it has none
+def _build_chart(chart, df):
+    start = time.perf_counter()
+    template = _build_template(chart.version, chart)
+    result, error = None, None
+    try:
+        #Bind the shared template to the current data
+        if template is not None:
+            result = _bind(template.chart, template.placeholder, _project(df, template.fields), template.plans)
+        #Otherwise execute the code with a local namespace holding the required objects
+        else:
+            local_vars = {"df": df, "alt": alt}
+            exec(chart.code, {}, local_vars)
+            #Keep the chart if the code created a variable named 'chart'
+            result = local_vars.get("chart")
+    except Exception as e:
+        error = e
+    return result, error, template is not None, (time.perf_counter() - start) * 1000
+
+
+#Share one pool of chart threads per size across reruns and sessions, so a chart that hangs ties up one thread
+#of the pool instead of leaving a new pool behind on every rerun
+@st.cache_resource(show_spinner=False)
+def _chart_pool(max_workers):
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="chart")
+
+
+#Note when a chart starts running on a pool thread, so its timeout doesn't count the time it spent queued
+def _run_chart(name, chart, df, started):
+    started[name] = time.perf_counter()
+    return _build_chart(chart, df)
+
+
+#Wait for the charts submitted to the pool, reporting a chart as a TimeoutError once it has run for `timeout` seconds,
+#or while still queued once none of the charts has started or finished for `timeout` seconds (the pool is stuck)
+def _collect(futures, started, timeout):
+    results, waiting = {}, set(futures)
+    progress = time.perf_counter()
+    while waiting:
+        now = time.perf_counter()
+        wait_s = None
+        if timeout is not None:
+            progress = max([progress] + list(started.values()))
+            for future in list(waiting):
+                name = futures[future]
+                deadline = started[name] + timeout if name in started else progress + timeout
+                if not future.done() and now >= deadline:
+                    #A hung chart is left running in the background instead of blocking the dashboard
+                    future.cancel()
+                    results[name] = (None, TimeoutError(f"chart did not finish within {timeout} s"), False, timeout * 1000)
+                    waiting.discard(future)
+                else:
+                    wait_s = max(0, deadline - now) if wait_s is None else min(wait_s, max(0, deadline - now))
+        done, _ = wait(waiting, timeout=wait_s, return_when=FIRST_COMPLETED)
+        for future in done:
+            results[futures[future]] = future.result()
+            waiting.discard(future)
+        if done:
+            progress = time.perf_counter()
+    return results
+
+
+#Build charts from the compiled chart files: charts that only hand `df` to Altair are bound from their shared
+#data-less template, any other chart code is executed against `df`. With more than one worker the charts are built
+#concurrently on a shared pool, and a chart still running `timeout` seconds after it started is reported as a TimeoutError.
+#Given a ChartCache and a key for the state `df` was filtered with, charts already built for that state are reused
+def build_charts(compiled, df, max_workers=1, timeout=None, cache=None, state_key=None):
+    """Return (charts, errors, timings): chart objects by name, exceptions by file name, and per-chart timings in ms, in the order of `compiled`."""
+    #Serve charts built earlier for the same code and filter state without touching the data
+    cached = {}
+    if cache is not None:
+        for name, chart in compiled.items():
+            hit = cache.get(chart.digest, state_key)
+            if hit is not None:
+                cached[name] = hit
+    pending = {name: chart for name, chart in compiled.items() if name not in cached}
+
+    if max_workers > 1 and len(pending) > 1:
+        pool, started = _chart_pool(max_workers), {}
+        futures = {pool.submit(_run_chart, name, chart, df, started): name for name, chart in pending.items()}
+        results = _collect(futures, started, timeout)
+    else:
+        results = {name: _build_chart(chart, df) for name, chart in pending.items()}
+
+    #Keep newly built charts for the next time this filter state comes back
+    if cache is not None:
+        for name, (result, error, _, _) in results.items():
+            if error is None and result is not None:
+                cache.put(compiled[name].digest, state_key, result)
+    results.update({name: (chart, None, False, 0.0) for name, chart in cached.items()})
+
+    charts, errors, timings = {}, {}, {}
+    for name, chart in compiled.items():
+        result, error, templated, execute_ms = results[name]
+        if error is not None:
+            errors[chart.fname] = error
+        elif result is not None:
+            charts[name] = result
+        timings[name] = {
+            "execute_ms": execute_ms,
+            "template": templated,
+            "cached": name in cached,
+        }
+    return charts, errors, timings
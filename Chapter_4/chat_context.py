@@ -0,0 +1,74 @@
+#Build with AI: AI-Powered Dashboards with Streamlit
+#Keep the AI Assistant's Prompt Within a Fixed Token Budget
+
+#Import packages
+import re
+
+#Most prompt tokens a single assistant request may use, and how many of them the summary of older turns may take
+CONTEXT_TOKEN_BUDGET = 3000
+SUMMARY_TOKEN_BUDGET = 500
+
+#Characters of each older message kept in the summary
+SUMMARY_LINE_CHARS = 200
+
+#Tokens the chat format adds around every message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+#Words, numbers and individual punctuation marks, roughly one model token each
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+#Estimate how many tokens a piece of text uses, without needing the model's tokenizer
+def count_tokens(text):
+    """Return an estimate of the number of model tokens in `text`."""
+    return len(TOKEN_PATTERN.findall(text)) + MESSAGE_OVERHEAD_TOKENS
+
+
+#Estimate the prompt tokens of a list of chat messages
+def count_message_tokens(messages):
+    """Return the estimated number of prompt tokens used by `messages`."""
+    return sum(count_tokens(msg["content"]) for msg in messages)
+
+
+#Sliding window over one session's chat history, with older turns compacted into a rolling summary
+class ChatContext:
+    """Build request messages that fit a token budget by summarizing turns that fall out of the window."""
+
+    def __init__(self, budget=CONTEXT_TOKEN_BUDGET, summary_budget=SUMMARY_TOKEN_BUDGET):
+        self.budget = budget
+        self.summary_budget = summary_budget
+        self.summary_lines = []
+        self.compacted = 0
+
+    #Fold one message that left the window into the summary, dropping the oldest summary lines past its budget
+    def _compact(self, msg):
+        speaker = "User asked" if msg["role"] == "user" else "Assistant answered"
+        text = " ".join(msg["content"].split())
+        if len(text) > SUMMARY_LINE_CHARS:
+            text = text[:SUMMARY_LINE_CHARS] + "..."
+        self.summary_lines.append(f"- {speaker}: {text}")
+        while len(self.summary_lines) > 1 and count_tokens(self.summary()) > self.summary_budget:
+            self.summary_lines.pop(0)
+
+    def summary(self):
+        """Return the summary of turns outside the window, or an empty string if there are none."""
+        if not self.summary_lines:
+            return ""
+        return "Summary of the earlier conversation:\n" + "\n".join(self.summary_lines)
+
+    def messages(self, system_prompt, history):
+        """Return the system prompt, the rolling summary and as many recent messages of `history` as fit the budget."""
+        #Start over if the history was cleared or replaced
+        if self.compacted > len(history):
+            self.summary_lines, self.compacted = [], 0
+        fixed = count_tokens(system_prompt)
+        window = [count_tokens(msg["content"]) for msg in history[self.compacted:]]
+        #Move the oldest messages into the summary until the request fits, always keeping the latest message
+        while len(window) > 1 and fixed + count_tokens(self.summary()) + sum(window) > self.budget:
+            self._compact(history[self.compacted])
+            self.compacted += 1
+            window.pop(0)
+        messages = [{"role": "system", "content": system_prompt}]
+        if self.summary_lines:
+            messages.append({"role": "system", "content": self.summary()})
+        return messages + list(history[self.compacted:])
@@ -0,0 +1,63 @@
+#Build with AI: AI-Powered Dashboards with Streamlit
+#Compute Column Statistics Once per Dataset Version
+
+#Import packages
+import streamlit as st
+import pandas as pd
+from data_store import DATASET_PATH, dataset_schema, dataset_version, load_dataset
+
+
+#Summarize one column of one dataset version; Streamlit keeps the result for every session in the process
+@st.cache_resource(max_entries=1024, show_spinner=False)
+def _column_stats(path, inode, mtime_ns, size, name):
+    series = load_dataset(path, columns=[name])[name]
+    stats = {"dtype": str(series.dtype), "null_count": int(series.isna().sum())}
+    #Classify the column the same way as the dashboard's numeric and categorical filter lists
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        stats["kind"] = "numeric"
+    elif pd.api.types.is_datetime64_any_dtype(series):
+        stats["kind"] = "date"
+    else:
+        stats["kind"] = "categorical"
+    #Capture the value range for numeric and date columns
+    if stats["kind"] in ("numeric", "date"):
+        stats["min"], stats["max"] = series.min(), series.max()
+    #Capture sorted distinct values with their counts and a few examples in order of appearance for other columns
+    if stats["kind"] != "numeric":
+        counts = series.value_counts(dropna=True)
+        stats["value_counts"] = {value: int(counts[value]) for value in sorted(counts.index.tolist())}
+        stats["examples"] = series.dropna().unique()[:5].tolist()
+    stats["distinct"] = int(series.nunique(dropna=True))
+    return stats
+
+
+#Look up the statistics for a single column
+def column_stats(name, path=DATASET_PATH):
+    """Return dtype, kind, null count, distinct count, min/max and sorted value counts for one column."""
+    return _column_stats(*dataset_version(path), name)
+
+
+#Look up the statistics for several columns (all columns by default)
+def column_catalog(path=DATASET_PATH, columns=None):
+    """Return a dict mapping each column name to its statistics."""
+    names = dataset_schema(path).columns if columns is None else columns
+    return {name: column_stats(name, path) for name in names}
+
+
+#Describe each column for AI prompts and summaries
+def summarize_columns(catalog):
+    """Return a markdown list describing each column's type and values."""
+    column_summaries = []
+    for col, stats in catalog.items():
+        #Show min and max values for numeric columns
+        if stats["kind"] == "numeric":
+            col_summary = f"- `{col}` (numeric): min = {stats['min']}, max = {stats['max']}"
+        #Show the date range for date columns
+        elif stats["kind"] == "date":
+            col_summary = f"- `{col}` (date): min = {stats['min'].date()}, max = {stats['max'].date()}"
+        #Otherwise show a few sample values for categorical or text columns
+        else:
+            sample_vals = ", ".join(map(str, stats["examples"]))
+            col_summary = f"- `{col}` (categorical/text): example values = {sample_vals}"
+        column_summaries.append(col_summary)
+    return "\n".join(column_summaries)
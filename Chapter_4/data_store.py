@@ -0,0 +1,157 @@
+#Build with AI: AI-Powered Dashboards with Streamlit
+#Load the Cleaned Dataset Once and Share It Across Reruns and Sessions
+
+#Import packages
+import streamlit as st
+import pandas as pd
+import pyarrow as pa
+import hashlib, os, pickle, tempfile
+from contextlib import contextmanager
+
+#Default location of the cleaned dataset, stored as an uncompressed Arrow IPC file so it can be memory-mapped
+DATASET_PATH = "cleaned_data_final.arrow"
+
+#Turn on copy-on-write so shallow copies of the shared frame can never write through to it (always on in pandas 3)
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+
+#Give each writer its own temporary file next to `path`, so concurrent writers never share one, and move it over
+#`path` only once the block finishes; a failed write leaves `path` untouched and removes the temporary file
+@contextmanager
+def atomic_path(path):
+    """Yield a unique temporary path in the folder of `path` that replaces `path` when the block exits cleanly."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".", suffix=".tmp")
+    os.close(fd)
+    try:
+        yield tmp_path
+        #mkstemp creates files only their owner can read
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+#Find the Arrow file, the legacy pickle and the reference file that can hold a dataset
+def _dataset_files(path):
+    base = os.path.splitext(path)[0]
+    return base + ".arrow", base + ".pkl", base + ".ref"
+
+
+#Read the Arrow file a reference points to, if the reference is at least as new as the dataset's own files
+def _follow_ref(path):
+    arrow_path, pickle_path, ref_path = _dataset_files(path)
+    if not os.path.exists(ref_path):
+        return None
+    ref_mtime = os.stat(ref_path).st_mtime_ns
+    if any(os.path.exists(p) and os.stat(p).st_mtime_ns > ref_mtime for p in (arrow_path, pickle_path)):
+        return None
+    with open(ref_path, encoding="utf-8") as f:
+        target = f.read().strip()
+    return target if os.path.exists(target) else None
+
+
+#Pick the file to read, converting a newer legacy pickle to Arrow so later loads can memory-map it
+def _resolve(path):
+    target = _follow_ref(path)
+    if target is not None:
+        return target
+    arrow_path, pickle_path, _ = _dataset_files(path)
+    if not os.path.exists(pickle_path):
+        return arrow_path
+    if os.path.exists(arrow_path) and os.stat(arrow_path).st_mtime_ns >= os.stat(pickle_path).st_mtime_ns:
+        return arrow_path
+    try:
+        with open(pickle_path, "rb") as f:
+            save_dataset(pickle.load(f), arrow_path)
+        return arrow_path
+    #Fall back to reading the pickle directly if the folder is read-only
+    except OSError:
+        return pickle_path
+
+
+#Identify the current contents of a dataset file without reading it
+def dataset_version(path=DATASET_PATH):
+    """Return a (path, inode, mtime, size) key that changes whenever the dataset file is rewritten."""
+    resolved = _resolve(path)
+    stat = os.stat(resolved)
+    return (os.path.abspath(resolved), stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+#Check that the cleaned dataset is available before a page tries to load it
+def dataset_exists(path=DATASET_PATH):
+    """Return True if the cleaned dataset exists as an Arrow file, a legacy pickle or a reference to an Arrow file."""
+    return _follow_ref(path) is not None or any(os.path.exists(p) for p in _dataset_files(path)[:2])
+
+
+#Write a dataset to the columnar store, replacing the old file atomically so readers never see a partial write
+def save_dataset(df, path=DATASET_PATH):
+    """Save a DataFrame as an uncompressed Arrow IPC file that readers can memory-map."""
+    arrow_path = _dataset_files(path)[0]
+    table = pa.Table.from_pandas(df)
+    with atomic_path(arrow_path) as tmp_path, pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    return arrow_path
+
+
+#Point a dataset at an existing Arrow file instead of keeping a copy of it
+def link_dataset(target, path=DATASET_PATH):
+    """Make `path` resolve to the Arrow file `target` by atomically writing a reference file; returns its path."""
+    ref_path = _dataset_files(path)[2]
+    with atomic_path(ref_path) as tmp_path, open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(os.path.abspath(target))
+    return ref_path
+
+
+#Memory-map one version of the Arrow file; the table's buffers are shared by every session in the process
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _open_table(path, inode, mtime_ns, size):
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+
+#Unpickle one version of a legacy pickle that could not be converted
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _load_pickle(path, inode, mtime_ns, size):
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+#Convert a single column to pandas once per file version, so each page only pays for the columns it uses
+@st.cache_resource(max_entries=256, show_spinner=False)
+def _load_column(path, inode, mtime_ns, size, name):
+    table = _open_table(path, inode, mtime_ns, size)
+    #Keep any stored index columns so every column comes back with the same index
+    index_cols = [c for c in table.schema.pandas_metadata["index_columns"] if isinstance(c, str)]
+    return table.select(index_cols + [name]).to_pandas(split_blocks=True)[name]
+
+
+#Return the dataset's columns and dtypes without converting any data
+def dataset_schema(path=DATASET_PATH):
+    """Return an empty DataFrame with the dataset's columns and dtypes."""
+    version = dataset_version(path)
+    if not version[0].endswith(".arrow"):
+        return _load_pickle(*version).iloc[0:0]
+    return _open_table(*version).schema.empty_table().to_pandas()
+
+
+#Hash the dataset's column names and types, which stay the same when only its rows change
+def schema_fingerprint(path=DATASET_PATH):
+    """Return a short hash identifying the dataset's columns and dtypes."""
+    schema = dataset_schema(path)
+    described = "\n".join(f"{col}:{dtype}" for col, dtype in schema.dtypes.items())
+    return hashlib.sha256(described.encode("utf-8")).hexdigest()[:16]
+
+
+#Load the cleaned dataset, reading only the requested columns and only when the file has changed
+def load_dataset(path=DATASET_PATH, columns=None):
+    """Return the cleaned dataset (or just `columns`) as a copy-on-write view of the shared, cached data."""
+    version = dataset_version(path)
+    #Serve legacy pickles from a single cached frame
+    if not version[0].endswith(".arrow"):
+        df = _load_pickle(*version)
+        return (df if columns is None else df[list(columns)]).copy(deep=False)
+    #Assemble the frame from cached columns; copy-on-write keeps callers from altering the shared data
+    names = list(dataset_schema(path).columns) if columns is None else list(columns)
+    return pd.DataFrame({name: _load_column(*version, name) for name in names}, columns=names, copy=False)
@@ -0,0 +1,271 @@
+#Build with AI: AI-Powered Dashboards with Streamlit
+#Store Dashboard Events as Rotating JSON Lines and Read Back Only the Newest
+
+#Import packages
+import streamlit as st
+import atexit, datetime, json, logging, os, queue, threading
+from logging.handlers import QueueHandler, RotatingFileHandler
+
+#Folder holding one JSON-lines file per event type, so each type can be read back without scanning the others
+EVENT_LOG_DIR = "dashboard_events"
+
+#Size at which an event file is rotated, and how many rotated files are kept per type
+MAX_LOG_BYTES = 5 * 1024 * 1024
+BACKUP_COUNT = 5
+
+#Bytes read at a time when reading a file backwards from its end
+TAIL_BLOCK_BYTES = 8192
+
+#Events waiting to be written before new ones are dropped, and most events written per file flush
+MAX_QUEUED_EVENTS = 10000
+WRITE_BATCH_EVENTS = 500
+
+#Seconds a caller may wait for room in a full queue before its event is dropped (0 never waits)
+QUEUE_BLOCK_S = 0
+
+#Event types the dashboard records
+EVENT_TYPES = ("filters", "charts", "layout", "feedback", "assistant")
+
+
+#Format each record as one JSON object per line, with its type and any extra fields
+class JsonLinesFormatter(logging.Formatter):
+    """Turn log records into single-line JSON events."""
+
+    def format(self, record):
+        event = {
+            "time": datetime.datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "type": getattr(record, "event_type", "general"),
+            "message": record.getMessage(),
+        }
+        event.update(getattr(record, "fields", {}))
+        return json.dumps(event, ensure_ascii=False, default=str)
+
+
+#Send each record to the rotating file for its event type, opening files only when a type is first used
+class EventTypeFileHandler(logging.Handler):
+    """Write records to `<folder>/<type>.jsonl`, rotating each file by size."""
+
+    def __init__(self, folder, max_bytes=MAX_LOG_BYTES, backup_count=BACKUP_COUNT):
+        super().__init__()
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._handlers = {}
+        self.setFormatter(JsonLinesFormatter())
+        os.makedirs(folder, exist_ok=True)
+
+    def _handler(self, event_type):
+        if event_type not in self._handlers:
+            handler = RotatingFileHandler(
+                os.path.join(self.folder, f"{event_type}.jsonl"), maxBytes=self.max_bytes,
+                backupCount=self.backup_count, encoding="utf-8", delay=True,
+            )
+            handler.setFormatter(self.formatter)
+            self._handlers[event_type] = handler
+        return self._handlers[event_type]
+
+    def emit(self, record):
+        self._handler(getattr(record, "event_type", "general")).emit(record)
+
+    def emit_batch(self, records):
+        """Write several records, rotating files as needed, and flush each file once at the end."""
+        written = set()
+        with self.lock:
+            for record in records:
+                handler = self._handler(getattr(record, "event_type", "general"))
+                try:
+                    if handler.shouldRollover(record):
+                        handler.doRollover()
+                    if handler.stream is None:
+                        handler.stream = handler._open()
+                    handler.stream.write(self.format(record) + handler.terminator)
+                    written.add(handler)
+                except Exception:
+                    self.handleError(record)
+            for handler in written:
+                handler.flush()
+
+    def flush(self):
+        for handler in self._handlers.values():
+            handler.flush()
+
+    def close(self):
+        for handler in self._handlers.values():
+            handler.close()
+        super().close()
+
+
+#Hand records to a bounded queue instead of writing them, dropping (and counting) events when the queue is full
+class BoundedQueueHandler(QueueHandler):
+    """Queue log records without blocking the caller for longer than `block_s`, counting the ones that don't fit."""
+
+    def __init__(self, max_queued=MAX_QUEUED_EVENTS, block_s=QUEUE_BLOCK_S):
+        super().__init__(queue.Queue(maxsize=max_queued))
+        self.block_s = block_s
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+
+    def enqueue(self, record):
+        try:
+            if self.block_s > 0:
+                self.queue.put(record, timeout=self.block_s)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+
+
+#Read the last `n` complete lines of a file by seeking backwards from its end, so the cost doesn't grow with the file
+def tail_lines(path, n):
+    """Return up to the last `n` lines of `path` as bytes, oldest first, reading about as many bytes as they hold."""
+    if n <= 0 or not os.path.exists(path):
+        return []
+    with open(path, "rb") as f:
+        pos = f.seek(0, os.SEEK_END)
+        chunks, newlines = [], 0
+        #One more newline than lines wanted guarantees the first kept line is complete
+        while pos > 0 and newlines <= n:
+            step = min(TAIL_BLOCK_BYTES, pos)
+            pos -= step
+            f.seek(pos)
+            chunk = f.read(step)
+            chunks.append(chunk)
+            newlines += chunk.count(b"\n")
+    data = b"".join(reversed(chunks))
+    #Leave out a last line still being written by another process, which has no newline yet
+    if not data.endswith(b"\n"):
+        data = data[:data.rfind(b"\n") + 1]
+    return data.splitlines()[-n:]
+
+
+#Parse one JSON line, skipping blank or damaged lines instead of failing the whole read
+def _decode_event(line):
+    try:
+        return json.loads(line) if line.strip() else None
+    except ValueError:
+        return None
+
+
+#Marks the end of the queue for the writer thread
+_STOP = object()
+
+
+#Structured event log for the dashboard, with one rotating file per event type
+class EventLog:
+    """Record dashboard events as JSON lines from a background writer, and read back the newest ones by type."""
+
+    def __init__(self, folder=EVENT_LOG_DIR, max_bytes=MAX_LOG_BYTES, backup_count=BACKUP_COUNT,
+                 max_queued=MAX_QUEUED_EVENTS, batch_size=WRITE_BATCH_EVENTS, block_s=QUEUE_BLOCK_S):
+        self.folder = folder
+        self.backup_count = backup_count
+        self.batch_size = batch_size
+        self.handler = EventTypeFileHandler(folder, max_bytes, backup_count)
+        self.queue_handler = BoundedQueueHandler(max_queued, block_s)
+        #Keep events out of the root logger, so other logging configuration doesn't duplicate them
+        self.logger = logging.getLogger(f"dashboard_events.{os.path.abspath(folder)}")
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        self.logger.handlers = [self.queue_handler]
+        #Write queued events on a background thread, and finish writing them when the server exits
+        self._writer = threading.Thread(target=self._write_events, name="event-log-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    #Take whatever events are waiting, up to a batch, and write them with one flush per file
+    def _write_events(self):
+        events = self.queue_handler.queue
+        while True:
+            batch = [events.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(events.get_nowait())
+                except queue.Empty:
+                    break
+            stop = _STOP in batch
+            self.handler.emit_batch([record for record in batch if record is not _STOP])
+            for _ in batch:
+                events.task_done()
+            if stop:
+                return
+
+    @property
+    def dropped(self):
+        """Number of events dropped because the queue was full."""
+        return self.queue_handler.dropped
+
+    @property
+    def queued(self):
+        """Number of events waiting to be written."""
+        return self.queue_handler.queue.qsize()
+
+    def log(self, event_type, message, level=logging.INFO, **fields):
+        """Queue an event of `event_type` without waiting for it to be written; keyword arguments become JSON fields."""
+        self.logger.log(level, message, extra={"event_type": event_type, "fields": fields})
+
+    def flush(self):
+        """Wait until every event queued so far has been written."""
+        if self._writer.is_alive():
+            self.queue_handler.queue.join()
+
+    def close(self):
+        """Write the remaining events, stop the writer and close the files."""
+        if self._writer.is_alive():
+            self.queue_handler.queue.put(_STOP)
+            self._writer.join()
+        self.handler.close()
+
+    #Files holding one type's events, newest first
+    def _files(self, event_type):
+        path = os.path.join(self.folder, f"{event_type}.jsonl")
+        return [path] + [f"{path}.{i}" for i in range(1, self.backup_count + 1)]
+
+    #Last `n` events of one type, reading into rotated files only when the current one holds fewer
+    def _tail_type(self, event_type, n):
+        events = []
+        for path in self._files(event_type):
+            if len(events) >= n or not os.path.exists(path):
+                break
+            needed = count = n - len(events)
+            while True:
+                lines = tail_lines(path, count)
+                found = [event for event in map(_decode_event, lines) if event]
+                #Read further back for each skipped line, until the file runs out
+                if len(found) >= needed or len(lines) < count:
+                    break
+                count += needed - len(found)
+            events = found[-needed:] + events
+        return events
+
+    def tail(self, n=10, event_type=None):
+        """Return the newest `n` events written so far, oldest first, of `event_type` or of every type."""
+        if event_type is not None:
+            return self._tail_type(event_type, n)
+        event_types = sorted(name[:-len(".jsonl")] for name in os.listdir(self.folder) if name.endswith(".jsonl"))
+        events = [event for t in event_types for event in self._tail_type(t, n)]
+        return sorted(events, key=lambda event: event["time"])[-n:]
+
+
+#Format events for display, one line each
+def format_events(events):
+    """Return events as 'time LEVEL [type]: message' lines."""
+    return "\n".join(f"{e['time']} {e['level']} [{e['type']}]: {e['message']}" for e in events)
+
+
+#Event logs opened by get_event_log by folder, so the one a cleared cache left behind can be stopped
+_open_logs = {}
+_open_logs_lock = threading.Lock()
+
+
+#Open the dashboard's event log once for the whole server, so every session appends through the same handlers
+@st.cache_resource(show_spinner=False)
+def get_event_log(folder=EVENT_LOG_DIR):
+    """Return the shared EventLog, closing the one opened before the cache was last cleared."""
+    with _open_logs_lock:
+        previous = _open_logs.pop(os.path.abspath(folder), None)
+        #Write its remaining events before the new log opens the same files
+        if previous is not None:
+            previous.close()
+        _open_logs[os.path.abspath(folder)] = EventLog(folder)
+        return _open_logs[os.path.abspath(folder)]
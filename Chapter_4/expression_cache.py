@@ -0,0 +1,104 @@
+#Build with AI: AI-Powered Dashboards with Streamlit
+#Remember the Pandas Expressions Generated for Questions Users Ask Again
+
+#Import packages
+import streamlit as st
+import re, sqlite3, threading, time
+
+#File the cache is kept in, so answers survive app restarts
+EXPRESSION_CACHE_PATH = "assistant_cache.sqlite"
+
+#How long a cached expression stays valid, and how many expressions are kept
+EXPRESSION_TTL_S = 7 * 24 * 3600
+MAX_CACHED_EXPRESSIONS = 1000
+
+#Filler words that don't change what a question asks for
+STOP_WORDS = {"a", "an", "the", "is", "are", "was", "what", "whats", "please", "me", "show", "tell", "give", "of", "can", "you"}
+
+
+#Words and numbers, plus the comparison and arithmetic symbols that change what a question asks for
+QUESTION_TOKEN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?|[<>!=]=?|[-+*/%]")
+
+
+#Reduce a plural word to its singular form, for the common English endings
+def _singular(word):
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 4 and word.endswith(("xes", "ches", "shes", "sses")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+#Reduce a question to a canonical form, so rewordings that only differ in case, punctuation, plurals or filler words
+#match; word order and symbols are kept, since "payroll minus revenue" and "profit < 100" ask for something else
+def normalize_question(question):
+    """Return the lowercased, singular words and the symbols of `question`, in order, without filler words."""
+    tokens = QUESTION_TOKEN.findall(re.sub(r"['’]", "", question.lower()))
+    return " ".join(_singular(token) for token in tokens if token not in STOP_WORDS)
+
+
+#Question -> expression cache stored in SQLite and shared by every session in the process
+class ExpressionCache:
+    """Persistent cache of generated expressions keyed by normalized question and schema fingerprint."""
+
+    def __init__(self, path=EXPRESSION_CACHE_PATH, ttl=EXPRESSION_TTL_S, max_entries=MAX_CACHED_EXPRESSIONS):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS expressions (question TEXT, schema TEXT, expression TEXT, "
+            "created REAL, used REAL, PRIMARY KEY (question, schema))"
+        )
+        self._db.commit()
+
+    #Drop expired entries, then the least recently used ones past the size limit
+    def _evict(self, now):
+        self._db.execute("DELETE FROM expressions WHERE created < ?", (now - self.ttl,))
+        self._db.execute(
+            "DELETE FROM expressions WHERE rowid NOT IN (SELECT rowid FROM expressions ORDER BY used DESC LIMIT ?)",
+            (self.max_entries,),
+        )
+
+    def get(self, question, schema):
+        """Return the cached expression for `question` on a dataset with this schema fingerprint, or None."""
+        normalized = normalize_question(question)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT expression FROM expressions WHERE question = ? AND schema = ? AND created >= ?",
+                (normalized, schema, now - self.ttl),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._db.execute("UPDATE expressions SET used = ? WHERE question = ? AND schema = ?", (now, normalized, schema))
+            self._db.commit()
+            return row[0]
+
+    def put(self, question, schema, expression):
+        """Store the expression generated for `question`, evicting expired and least recently used entries."""
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO expressions VALUES (?, ?, ?, ?, ?)",
+                (normalize_question(question), schema, expression, now, now),
+            )
+            self._evict(now)
+            self._db.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM expressions").fetchone()[0]
+
+
+#Open the expression cache once for the whole process
+@st.cache_resource(show_spinner=False)
+def get_expression_cache(path=EXPRESSION_CACHE_PATH):
+    """Return the ExpressionCache shared by every dashboard session."""
+    return ExpressionCache(path)
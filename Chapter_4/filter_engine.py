@@ -0,0 +1,118 @@
+#Build with AI: AI-Powered Dashboards with Streamlit
+#Apply Sidebar Filters Using Precomputed Column Indexes
+
+#Import packages
+import streamlit as st
+import numpy as np
+import pandas as pd
+import threading
+from collections import OrderedDict
+from data_store import DATASET_PATH, dataset_version
+
+#Categorical columns with at most this many distinct values keep one bitmap per category
+MAX_BITMAP_CATEGORIES = 64
+
+#Number of predicate bitmaps to keep, so unchanged filters are never recomputed
+MAX_CACHED_PREDICATES = 64
+
+
+#Indexes and predicate bitmaps for one version of the dataset, shared by every session
+class FilterEngine:
+    """Turn range and isin filters into a single row selection using sorted indexes and category bitmaps."""
+
+    def __init__(self):
+        self._numeric = {}
+        self._categorical = {}
+        self._predicates = OrderedDict()
+        self._lock = threading.Lock()
+
+    #Sort a numeric column once so any range becomes two binary searches
+    def _numeric_index(self, series):
+        if series.name not in self._numeric:
+            values = series.to_numpy(dtype="float64", na_value=np.nan)
+            order = np.argsort(values, kind="stable")
+            self._numeric[series.name] = (values[order], order)
+        return self._numeric[series.name]
+
+    #Encode a categorical column as integer codes, with packed bitmaps per category for low-cardinality columns
+    def _categorical_index(self, series):
+        if series.name not in self._categorical:
+            codes, categories = pd.factorize(series)
+            lookup = {value: code for code, value in enumerate(categories)}
+            bitmaps = None
+            if len(categories) <= MAX_BITMAP_CATEGORIES:
+                bitmaps = [np.packbits(codes == code) for code in range(len(categories))]
+            self._categorical[series.name] = (codes, lookup, bitmaps)
+        return self._categorical[series.name]
+
+    #Bitmap of rows whose value falls inside [low, high]; NaN rows never match, as with pandas comparisons
+    def _range_bitmap(self, series, low, high):
+        sorted_values, order = self._numeric_index(series)
+        start = np.searchsorted(sorted_values, low, side="left")
+        stop = np.searchsorted(sorted_values, high, side="right")
+        mask = np.zeros(len(order), dtype=bool)
+        mask[order[start:stop]] = True
+        return np.packbits(mask)
+
+    #Bitmap of rows whose value is one of the selected options; NaN rows never match, as with Series.isin
+    def _isin_bitmap(self, series, options):
+        codes, lookup, bitmaps = self._categorical_index(series)
+        selected = sorted({lookup[o] for o in options if o in lookup})
+        #OR together the per-category bitmaps when they exist
+        if bitmaps is not None:
+            result = np.zeros_like(bitmaps[0]) if bitmaps else np.packbits(np.zeros(len(codes), dtype=bool))
+            for code in selected:
+                result |= bitmaps[code]
+            return result
+        #Otherwise look each row's code up in a table of selected codes (the last slot catches NaN's -1 code)
+        table = np.zeros(len(lookup) + 1, dtype=bool)
+        table[selected] = True
+        return np.packbits(table[codes])
+
+    #Return a cached predicate bitmap, computing it only when this exact filter value hasn't been seen
+    def _predicate(self, key, compute):
+        with self._lock:
+            if key in self._predicates:
+                self._predicates.move_to_end(key)
+                return self._predicates[key]
+        bitmap = compute()
+        with self._lock:
+            self._predicates[key] = bitmap
+            while len(self._predicates) > MAX_CACHED_PREDICATES:
+                self._predicates.popitem(last=False)
+        return bitmap
+
+    def selection(self, df, numeric_ranges=None, categorical_options=None):
+        """Return a boolean row mask for `df`, or None when no filters are active."""
+        bitmaps = []
+        for col, (low, high) in (numeric_ranges or {}).items():
+            key = ("range", col, float(low), float(high))
+            bitmaps.append(self._predicate(key, lambda: self._range_bitmap(df[col], low, high)))
+        for col, options in (categorical_options or {}).items():
+            key = ("isin", col, frozenset(options))
+            bitmaps.append(self._predicate(key, lambda: self._isin_bitmap(df[col], options)))
+        if not bitmaps:
+            return None
+        #AND all predicates together on packed bits, then expand into one selection vector
+        combined = np.bitwise_and.reduce(bitmaps) if len(bitmaps) > 1 else bitmaps[0]
+        return np.unpackbits(combined, count=len(df)).astype(bool)
+
+    def apply(self, df, numeric_ranges=None, categorical_options=None):
+        """Return the rows of `df` matching every range in `numeric_ranges` and every option list in `categorical_options`."""
+        mask = self.selection(df, numeric_ranges, categorical_options)
+        #Skip building a new frame when nothing is filtered out
+        if mask is None or mask.all():
+            return df
+        return df[mask]
+
+
+#Build one filter engine per dataset version and share it across sessions
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _engine_for_version(path, inode, mtime_ns, size):
+    return FilterEngine()
+
+
+#Return the filter engine for the current version of the cleaned dataset
+def get_filter_engine(path=DATASET_PATH):
+    """Return the shared FilterEngine for the dataset at `path`, rebuilt whenever the file changes."""
+    return _engine_for_version(*dataset_version(path))
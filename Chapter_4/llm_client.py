@@ -0,0 +1,40 @@
+#Build with AI: AI-Powered Dashboards with Streamlit
+#Create OpenAI Clients with Pooled Connections, Timeouts and Retries
+
+#Import packages
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, Timeout
+
+#Use the HTTP library the installed OpenAI package is built on
+try:
+    import httpx
+except ImportError:
+    import httpx2 as httpx
+
+#Connections a client may open at once, and how many idle ones it keeps alive for reuse
+MAX_CONNECTIONS = 20
+MAX_KEEPALIVE_CONNECTIONS = 10
+KEEPALIVE_EXPIRY_S = 60
+
+#Seconds to wait for a connection and for a whole request
+CONNECT_TIMEOUT_S = 5
+REQUEST_TIMEOUT_S = 60
+
+#Times a failed request (connection errors, 408, 409, 429 and 5xx) is retried with jittered exponential backoff
+MAX_RETRIES = 3
+
+
+#Connection pool limits for a client
+def _limits(max_connections):
+    return httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=min(MAX_KEEPALIVE_CONNECTIONS, max_connections),
+        keepalive_expiry=KEEPALIVE_EXPIRY_S,
+    )
+
+
+#Create a pooled asyncio client for code that schedules its own requests on an event loop
+def make_async_openai_client(api_key=None, base_url=None, max_connections=MAX_CONNECTIONS, timeout=REQUEST_TIMEOUT_S,
+                             max_retries=MAX_RETRIES):
+    """Return a new AsyncOpenAI client with pooled keep-alive connections, timeouts and retries."""
+    http_client = DefaultAsyncHttpxClient(limits=_limits(max_connections), timeout=Timeout(timeout, connect=CONNECT_TIMEOUT_S))
+    return AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client, max_retries=max_retries)
@@ -0,0 +1,196 @@
+#Build with AI: AI-Powered Dashboards with Streamlit
+#Queue Every Page's LLM Requests Through One Rate-Limited Scheduler
+
+#Import packages
+import streamlit as st
+import asyncio, queue, random, threading, time
+from collections import deque
+from types import SimpleNamespace
+import openai
+from chat_context import count_message_tokens
+from llm_client import make_async_openai_client
+
+#Requests sent to the API at once across every session and page
+MAX_CONCURRENT_REQUESTS = 8
+
+#Prompt plus reply tokens the process may send per minute, and the reply size assumed when a request sets no max_tokens
+TOKENS_PER_MINUTE = 90000
+REPLY_TOKEN_ALLOWANCE = 500
+
+#Retries for rate-limited (429), server (5xx) and connection errors, with full-jitter exponential backoff in seconds
+MAX_RETRIES = 5
+BACKOFF_BASE_S = 0.5
+BACKOFF_MAX_S = 20
+
+#Number of recent queue wait times kept for the metrics
+WAIT_SAMPLES = 200
+
+#Marks the end of a streamed reply on its way from the event loop to the reading thread
+_END = object()
+
+
+#Decide whether a failed request is worth retrying
+def _retryable(error):
+    if isinstance(error, openai.APIConnectionError):
+        return True
+    return isinstance(error, openai.APIStatusError) and (error.status_code == 429 or error.status_code >= 500)
+
+
+#Seconds to wait before the next attempt, honoring a Retry-After header when the server sends one
+def _backoff(error, attempt):
+    delay = random.uniform(0, min(BACKOFF_MAX_S, BACKOFF_BASE_S * 2 ** attempt))
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        return max(delay, min(BACKOFF_MAX_S, float(retry_after)))
+    except (TypeError, ValueError):
+        return delay
+
+
+#One asyncio event loop, on its own thread, that admits, sends and retries the process's completion requests
+class LLMScheduler:
+    """Queue chat completions under a global concurrency limit and token-per-minute budget, retrying 429s and 5xx."""
+
+    def __init__(self, client, max_concurrency=MAX_CONCURRENT_REQUESTS, tokens_per_minute=TOKENS_PER_MINUTE,
+                 max_retries=MAX_RETRIES):
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        #Offer the same chat.completions.create call as an OpenAI client, so pages can use either
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+        self._counts = {"queued": 0, "in_flight": 0, "completed": 0, "failed": 0, "retries": 0, "rate_limited": 0}
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+        self._sent = deque()
+        self._lock = threading.Lock()
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, name="llm-scheduler", daemon=True).start()
+        self._slots = None
+
+    def _count(self, key, delta=1):
+        with self._lock:
+            self._counts[key] += delta
+
+    #Wait for a concurrency slot, then for room in the last minute's token budget
+    async def _admit(self, tokens):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        queued_at = time.perf_counter()
+        acquired = False
+        self._count("queued")
+        try:
+            await self._slots.acquire()
+            acquired = True
+            while True:
+                now = time.monotonic()
+                #Change the sent log under the lock, since metrics() reads it from other threads
+                with self._lock:
+                    while self._sent and self._sent[0][0] <= now - 60:
+                        self._sent.popleft()
+                    used = sum(sent for _, sent in self._sent)
+                    #A request bigger than the whole budget still goes through once nothing else was sent this minute
+                    if not self._sent or used + tokens <= self.tokens_per_minute:
+                        self._sent.append((now, tokens))
+                        break
+                    retry_at = self._sent[0][0] + 60
+                await asyncio.sleep(retry_at - now)
+        #Give the slot back if the request is cancelled while waiting for budget
+        except BaseException:
+            if acquired:
+                self._slots.release()
+            raise
+        finally:
+            self._count("queued", -1)
+        with self._lock:
+            self._waits.append((time.perf_counter() - queued_at) * 1000)
+        self._count("in_flight")
+
+    def _release(self):
+        self._count("in_flight", -1)
+        self._slots.release()
+
+    #Send one request, retrying retryable failures; streamed chunks are handed to `chunks` as they arrive
+    async def _run(self, kwargs, chunks=None):
+        tokens = count_message_tokens(kwargs.get("messages", [])) + (kwargs.get("max_tokens") or REPLY_TOKEN_ALLOWANCE)
+        await self._admit(tokens)
+        try:
+            for attempt in range(self.max_retries + 1):
+                started = False
+                try:
+                    if chunks is None:
+                        result = await self.client.chat.completions.create(**kwargs)
+                    else:
+                        stream = await self.client.chat.completions.create(**kwargs)
+                        try:
+                            async for chunk in stream:
+                                started = True
+                                chunks.put(chunk)
+                        finally:
+                            await stream.close()
+                        chunks.put(_END)
+                        result = None
+                    self._count("completed")
+                    return result
+                except Exception as e:
+                    if isinstance(e, openai.APIStatusError) and e.status_code == 429:
+                        self._count("rate_limited")
+                    #A stream that already produced text can't be retried without repeating it
+                    if started or attempt == self.max_retries or not _retryable(e):
+                        self._count("failed")
+                        raise
+                    self._count("retries")
+                    await asyncio.sleep(_backoff(e, attempt))
+        finally:
+            self._release()
+
+    #Hand a streamed reply's chunks from the event loop to the calling thread
+    def _stream(self, kwargs):
+        chunks = queue.Queue()
+
+        #Pass on the error of a request that failed, and always wake up the reader when the request ends
+        def finished(future):
+            error = None if future.cancelled() else future.exception()
+            chunks.put(error if error is not None else _END)
+
+        future = asyncio.run_coroutine_threadsafe(self._run(kwargs, chunks), self._loop)
+        future.add_done_callback(finished)
+        try:
+            while True:
+                chunk = chunks.get()
+                if chunk is _END:
+                    break
+                if isinstance(chunk, BaseException):
+                    raise chunk
+                yield chunk
+        #Stop the request if the reader gives up early
+        finally:
+            future.cancel()
+
+    def create(self, **kwargs):
+        """Queue a chat completion and wait for it; with stream=True, return an iterator over its chunks."""
+        if kwargs.get("stream"):
+            return self._stream(kwargs)
+        return asyncio.run_coroutine_threadsafe(self._run(kwargs), self._loop).result()
+
+    def metrics(self):
+        """Return queue depth, in-flight and outcome counts, tokens sent in the last minute, and recent wait times in ms."""
+        with self._lock:
+            metrics = dict(self._counts)
+            waits = sorted(self._waits)
+            sent = list(self._sent)
+        metrics["tokens_last_minute"] = sum(tokens for sent_at, tokens in sent if sent_at > time.monotonic() - 60)
+        metrics["avg_wait_ms"] = sum(waits) / len(waits) if waits else 0.0
+        metrics["p95_wait_ms"] = waits[int(len(waits) * 0.95)] if waits else 0.0
+        return metrics
+
+
+#Create one scheduler per API key for the whole process, so every page shares its limits
+@st.cache_resource(show_spinner=False)
+def _shared_scheduler(api_key, base_url):
+    return LLMScheduler(make_async_openai_client(api_key, base_url, max_connections=MAX_CONCURRENT_REQUESTS, max_retries=0))
+
+
+#Look up the shared request scheduler
+def get_llm_scheduler(api_key=None, base_url=None):
+    """Return the process-wide LLMScheduler for this API key; it can be used in place of an OpenAI client."""
+    return _shared_scheduler(api_key, base_url)
@@ -0,0 +1,28 @@
+#Build with AI: AI-Powered Dashboards with Streamlit
+#Stream Chat Completions Token by Token
+
+#Import packages
+import time
+
+#Model used by the dashboard's AI Assistant
+ASSISTANT_MODEL = "gpt-3.5-turbo"
+
+
+#Request a streamed chat completion and yield the text of each chunk as it arrives
+def stream_completion(client, messages, model=ASSISTANT_MODEL, stats=None):
+    """Yield the reply's text pieces in order; `stats`, if given, receives time-to-first-token and total time in ms."""
+    start = time.perf_counter()
+    stream = client.chat.completions.create(model=model, messages=messages, stream=True)
+    try:
+        for chunk in stream:
+            #Skip chunks without text, such as the role header and the final finish-reason chunk
+            if not chunk.choices or not chunk.choices[0].delta.content:
+                continue
+            if stats is not None and "first_token_ms" not in stats:
+                stats["first_token_ms"] = (time.perf_counter() - start) * 1000
+            yield chunk.choices[0].delta.content
+    #Close the HTTP response even if the caller stops reading early
+    finally:
+        stream.close()
+        if stats is not None:
+            stats["total_ms"] = (time.perf_counter() - start) * 1000
@@ -0,0 +1,179 @@
+#Build with AI: AI-Powered Dashboards with Streamlit
+#Time Each Stage of a Dashboard Rerun and Keep Rolling Histograms
+
+#Import packages
+import streamlit as st
+import json, os, threading, time
+from collections import deque
+from contextlib import contextmanager
+from data_store import atomic_path
+
+#Recent timings kept per stage
+PROFILE_HISTORY = 200
+
+#Upper bounds, in ms, of the histogram buckets; the last bucket holds everything slower
+HISTOGRAM_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+#File the stage statistics are exported to, and the least time between automatic exports
+METRICS_PATH = "dashboard_metrics.json"
+METRICS_EXPORT_INTERVAL_S = 30
+
+#Environment variable holding the token that unlocks the timing panel through the `admin` query parameter
+ADMIN_TOKEN_ENV = "DASHBOARD_ADMIN_TOKEN"
+
+
+#Rolling timings of one stage, reset when the code it times changes so each version is measured on its own
+class StageStats:
+    """Keep the latest timings of a stage, plus a summary of the previous version's timings for comparison."""
+
+    def __init__(self, history=PROFILE_HISTORY):
+        self.samples = deque(maxlen=history)
+        self.version = None
+        self.previous = None
+
+    def add(self, ms, version=None):
+        if version is not None and version != self.version:
+            if self.version is not None and self.samples:
+                self.previous = dict(self.summary(), version=self.version)
+            self.samples.clear()
+            self.version = version
+        self.samples.append(ms)
+
+    def histogram(self):
+        """Return the number of recent samples in each bucket, labelled by its upper bound."""
+        counts = dict.fromkeys([f"≤{bound} ms" for bound in HISTOGRAM_BUCKETS_MS] + [f">{HISTOGRAM_BUCKETS_MS[-1]} ms"], 0)
+        labels = list(counts)
+        for ms in self.samples:
+            bucket = next((i for i, bound in enumerate(HISTOGRAM_BUCKETS_MS) if ms <= bound), len(HISTOGRAM_BUCKETS_MS))
+            counts[labels[bucket]] += 1
+        return counts
+
+    def summary(self):
+        """Return the count, last, mean, median, p95 and max of the recent samples in ms."""
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {"count": 0}
+        return {
+            "count": len(ordered),
+            "last_ms": self.samples[-1],
+            "mean_ms": sum(ordered) / len(ordered),
+            "p50_ms": ordered[len(ordered) // 2],
+            "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+            "max_ms": ordered[-1],
+        }
+
+
+#Timings of the stages of one rerun, added to the shared statistics when the rerun finishes
+class RerunTimer:
+    """Collect stage timings for a single rerun."""
+
+    def __init__(self, profiler):
+        self.profiler = profiler
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.versions = {}
+
+    @contextmanager
+    def stage(self, name, version=None):
+        """Time the enclosed block as stage `name`; a stage timed twice in a rerun adds up."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - started) * 1000, version)
+
+    def record(self, name, ms, version=None):
+        """Add a timing measured elsewhere, e.g. a chart's build time."""
+        self.stages[name] = self.stages.get(name, 0.0) + ms
+        if version is not None:
+            self.versions[name] = version
+
+    def finish(self):
+        """Record the rerun's stages and total time in the shared statistics; returns this rerun's timings in ms."""
+        self.stages["total"] = (time.perf_counter() - self.started) * 1000
+        self.profiler.add(self.stages, self.versions)
+        return dict(self.stages)
+
+
+#Process-wide statistics for every stage of every rerun, across all sessions
+class RerunProfiler:
+    """Keep rolling timings per stage and export their statistics to a metrics file."""
+
+    def __init__(self, history=PROFILE_HISTORY, metrics_path=METRICS_PATH, export_interval_s=METRICS_EXPORT_INTERVAL_S):
+        self.history = history
+        self.metrics_path = metrics_path
+        self.export_interval_s = export_interval_s
+        self.reruns = 0
+        self._stages = {}
+        self._last_export = 0.0
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start timing a rerun."""
+        return RerunTimer(self)
+
+    def add(self, stages, versions=None):
+        """Add one rerun's stage timings, exporting the statistics if the last export is old enough."""
+        versions = versions or {}
+        with self._lock:
+            self.reruns += 1
+            for name, ms in stages.items():
+                self._stages.setdefault(name, StageStats(self.history)).add(ms, versions.get(name))
+            due = self.metrics_path and time.monotonic() - self._last_export >= self.export_interval_s
+            if due:
+                self._last_export = time.monotonic()
+        if due:
+            self.export()
+
+    def stats(self):
+        """Return {stage: summary} with each stage's version, previous-version summary and histogram."""
+        with self._lock:
+            return {
+                name: dict(stats.summary(), version=stats.version, previous=stats.previous, histogram=stats.histogram())
+                for name, stats in self._stages.items()
+            }
+
+    def export(self, path=None):
+        """Write the statistics to a JSON metrics file, replacing the old file atomically; returns its path."""
+        path = path or self.metrics_path
+        metrics = {"exported": time.time(), "reruns": self.reruns, "stages": self.stats()}
+        with atomic_path(path) as tmp_path, open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(metrics, f, indent=1)
+        return path
+
+
+#Keep one profiler for the whole server, so the histograms cover every session
+@st.cache_resource(show_spinner=False)
+def get_rerun_profiler():
+    """Return the shared RerunProfiler."""
+    return RerunProfiler()
+
+
+#Show the timing panel only to visitors whose `admin` query parameter matches the configured token
+def is_admin():
+    """Return True if the admin token is configured and given in the page URL."""
+    token = os.getenv(ADMIN_TOKEN_ENV)
+    return bool(token) and st.query_params.get("admin") == token
+
+
+#Render this rerun's stage timings and the rolling statistics for every stage
+def render_timing_panel(profiler, timings):
+    """Show a table of stage timings, a histogram for a chosen stage and a button to export the metrics."""
+    stats = profiler.stats()
+    rows = [
+        {
+            "stage": name, "this rerun (ms)": round(timings.get(name, 0.0), 1), "count": summary.get("count", 0),
+            "mean (ms)": round(summary.get("mean_ms", 0.0), 1), "p95 (ms)": round(summary.get("p95_ms", 0.0), 1),
+            "max (ms)": round(summary.get("max_ms", 0.0), 1),
+            "previous version mean (ms)": round(summary["previous"]["mean_ms"], 1) if summary["previous"] else None,
+        }
+        for name, summary in sorted(stats.items(), key=lambda item: -item[1].get("mean_ms", 0.0))
+    ]
+    with st.expander("⏱️ Rerun Timings", expanded=True):
+        st.caption(f"{profiler.reruns} reruns profiled")
+        st.dataframe(rows, hide_index=True)
+        stage = st.selectbox("Histogram for stage", [row["stage"] for row in rows], key="profiler_stage")
+        if stage:
+            st.bar_chart(stats[stage]["histogram"])
+        if st.button("Export metrics", key="profiler_export"):
+            st.success(f"Metrics written to {profiler.export()}")
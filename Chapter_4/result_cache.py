@@ -0,0 +1,61 @@
+#Build with AI: AI-Powered Dashboards with Streamlit
+#Remember the Results of Assistant Expressions for Each Filter State
+
+#Import packages
+import streamlit as st
+import ast, hashlib, threading
+from collections import OrderedDict
+from data_store import DATASET_PATH, dataset_version
+
+#Number of evaluated results to keep per dataset version
+MAX_CACHED_RESULTS = 256
+
+
+#Hash an expression's syntax tree, so formatting and quoting differences don't count as a new expression
+def expression_hash(expression):
+    """Return a hash of the parsed expression; raises SyntaxError if it isn't a single Python expression."""
+    tree = ast.dump(ast.parse(expression.strip(), mode="eval"))
+    return hashlib.sha256(tree.encode("utf-8")).hexdigest()
+
+
+#Displayed results of evaluated expressions for one dataset version, shared by every session
+class ResultCache:
+    """Least-recently-used store of expression results keyed by expression hash and filter state."""
+
+    def __init__(self, max_entries=MAX_CACHED_RESULTS):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, expr_hash, state_key):
+        """Return the stored result for this expression and filter state, or None if it hasn't been evaluated."""
+        key = (expr_hash, state_key)
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+    def put(self, expr_hash, state_key, result):
+        """Store a result, dropping the least recently used ones past the size limit."""
+        with self._lock:
+            self._entries[(expr_hash, state_key)] = result
+            self._entries.move_to_end((expr_hash, state_key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+#Create one result cache per dataset version, so results from an older file are dropped with it
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _results_for_version(path, inode, mtime_ns, size):
+    return ResultCache()
+
+
+#Return the result cache for the current version of the cleaned dataset
+def get_result_cache(path=DATASET_PATH):
+    """Return the shared ResultCache for the dataset at `path`, starting empty whenever the file changes."""
+    return _results_for_version(*dataset_version(path))